@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+启动耗时基准测试
+测量 tennis_booking.py 从进程启动到完成参数解析和配置校验的耗时（不连接浏览器），
+以及导入 Selenium 的额外耗时，用于评估 cron / systemd 定时启动的固定开销
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tennis_booking.py")
+
+
+def time_command(args, runs):
+    """运行命令 runs 次，返回每次耗时（毫秒）列表"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(name, timings):
+    """打印中位数和最大值"""
+    print(f"{name:<28} 中位数 {statistics.median(timings):7.1f} ms | 最大 {max(timings):7.1f} ms")
+
+
+def main():
+    """主函数"""
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print(f"每项运行 {runs} 次\n")
+
+    baseline = time_command([sys.executable, "-c", "pass"], runs)
+    report("python 解释器启动", baseline)
+
+    cli = time_command([sys.executable, SCRIPT, "--print-config"], runs)
+    report("tennis_booking 解析+校验", cli)
+    print(f"{'脚本自身开销':<28} 中位数 {statistics.median(cli) - statistics.median(baseline):7.1f} ms")
+
+    if subprocess.run([sys.executable, "-c", "import selenium"], capture_output=True).returncode == 0:
+        selenium = time_command([sys.executable, "-c", "from selenium import webdriver"], runs)
+        report("导入 selenium.webdriver", selenium)
+    else:
+        print("未安装 selenium，跳过导入测试")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+浏览器生命周期管理
+在 Linux 上启动 Edge / Chromium（远程调试模式），轮询 /json/version 判断就绪，
+查找或打开预订标签页，并在浏览器意外退出时自动重启。
+替代原来仅支持 macOS 的 start_edge.sh / check_edge.sh
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+DEFAULT_PORT = 9222
+BOOKING_URL = "https://members.swtc.ca/booking.html#"
+DEFAULT_USER_DATA_DIR = os.path.expanduser("~/.cache/tennis-booking/browser-profile")
+
+# 按优先顺序查找的浏览器可执行文件（命令名在 PATH 中查找，绝对路径为 macOS 的应用包）
+BROWSER_CANDIDATES = {
+    "edge": ["microsoft-edge", "microsoft-edge-stable", "microsoft-edge-beta", "msedge",
+             "/Applications/Microsoft Edge.app/Contents/MacOS/Microsoft Edge"],
+    "chromium": ["chromium", "chromium-browser", "google-chrome", "google-chrome-stable",
+                 "/Applications/Chromium.app/Contents/MacOS/Chromium",
+                 "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"],
+}
+
+
+def find_browser_binary(browser="edge"):
+    """
+    查找浏览器可执行文件
+
+    Args:
+        browser: "edge"、"chromium" 或可执行文件路径
+
+    Returns:
+        可执行文件的完整路径，找不到时返回None
+    """
+    if browser and os.path.sep in browser:
+        return browser if os.access(browser, os.X_OK) else None
+
+    names = BROWSER_CANDIDATES.get(browser, [browser])
+    # 找不到 Edge 时退回 Chromium（同样支持 CDP 远程调试）
+    if browser == "edge":
+        names = names + BROWSER_CANDIDATES["chromium"]
+
+    for name in names:
+        if os.path.isabs(name):
+            if os.access(name, os.X_OK):
+                return name
+            continue
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+
+def _devtools_request(port, path, method="GET", timeout=0.5):
+    """向 DevTools HTTP 接口发送请求，返回解析后的 JSON"""
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", method=method)
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def get_browser_version(port=DEFAULT_PORT, timeout=0.5):
+    """
+    读取 /json/version
+
+    Returns:
+        版本信息字典；端口不可用时返回None
+    """
+    try:
+        return _devtools_request(port, "/json/version", timeout=timeout)
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
+
+
+def wait_until_ready(port=DEFAULT_PORT, timeout=15, poll_interval=0.05, process=None):
+    """
+    轮询 /json/version 直到浏览器可连接（代替固定的 sleep）
+
+    Args:
+        port: 远程调试端口
+        timeout: 最长等待时间（秒）
+        poll_interval: 轮询间隔（秒）
+        process: 若提供，进程退出时立即返回失败
+
+    Returns:
+        版本信息字典；超时或进程退出时返回None
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        info = get_browser_version(port, timeout=poll_interval * 4)
+        if info:
+            return info
+        if process is not None and process.poll() is not None:
+            return None
+        time.sleep(poll_interval)
+    return None
+
+
+def list_tabs(port=DEFAULT_PORT):
+    """返回所有页面类型的标签页 [{id, url, title, ...}, ...]"""
+    try:
+        targets = _devtools_request(port, "/json/list")
+    except (urllib.error.URLError, OSError, ValueError):
+        return []
+    return [t for t in targets if t.get("type") == "page"]
+
+
+def find_booking_tab(port=DEFAULT_PORT, url=BOOKING_URL):
+    """
+    按 URL 查找预订标签页（忽略 # 后的部分）
+
+    Returns:
+        标签页信息字典，找不到时返回None
+    """
+    prefix = url.split("#", 1)[0]
+    for tab in list_tabs(port):
+        if tab.get("url", "").startswith(prefix):
+            return tab
+    return None
+
+
+def open_tab(port=DEFAULT_PORT, url=BOOKING_URL):
+    """新建标签页并打开指定 URL，返回标签页信息字典"""
+    path = "/json/new?" + urllib.parse.quote(url, safe=":/?&=")
+    try:
+        # 新版 Chromium 要求 PUT，旧版只接受 GET
+        return _devtools_request(port, path, method="PUT", timeout=2)
+    except urllib.error.HTTPError:
+        return _devtools_request(port, path, method="GET", timeout=2)
+
+
+def find_or_open_booking_tab(port=DEFAULT_PORT, url=BOOKING_URL):
+    """查找预订标签页，不存在时新开一个"""
+    tab = find_booking_tab(port, url)
+    if tab:
+        return tab
+    return open_tab(port, url)
+
+
+class BrowserManager:
+    """
+    管理一个远程调试模式的浏览器进程
+
+    用法:
+        manager = BrowserManager(headless=True)
+        manager.ensure_running()
+        tab = manager.ensure_booking_tab()
+    """
+
+    def __init__(self, browser="edge", port=DEFAULT_PORT, user_data_dir=DEFAULT_USER_DATA_DIR,
+                 headless=False, url=BOOKING_URL, extra_args=None):
+        self.browser = browser
+        self.port = port
+        self.user_data_dir = user_data_dir
+        self.headless = headless
+        self.url = url
+        self.extra_args = list(extra_args or [])
+        self.process = None
+        self.restarts = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._watchdog = None
+
+    def build_command(self, binary):
+        """构造浏览器启动命令"""
+        args = [
+            binary,
+            f"--remote-debugging-port={self.port}",
+            f"--user-data-dir={self.user_data_dir}",
+            "--no-first-run",
+            "--no-default-browser-check",
+            "--disable-background-timer-throttling",
+            "--disable-renderer-backgrounding",
+            "--disable-backgrounding-occluded-windows",
+        ]
+        if self.headless:
+            args += ["--headless=new", "--window-size=1400,1000"]
+        args += self.extra_args
+        args.append(self.url)
+        return args
+
+    def is_alive(self):
+        """浏览器是否可连接（端口响应 /json/version）"""
+        return get_browser_version(self.port) is not None
+
+    def start(self, timeout=15):
+        """
+        启动浏览器并等待就绪
+
+        Returns:
+            版本信息字典
+
+        Raises:
+            RuntimeError: 找不到浏览器或启动超时
+        """
+        binary = find_browser_binary(self.browser)
+        if not binary:
+            raise RuntimeError(f"未找到浏览器: {self.browser}")
+
+        os.makedirs(self.user_data_dir, exist_ok=True)
+        self.process = subprocess.Popen(
+            self.build_command(binary),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        started = time.monotonic()
+        info = wait_until_ready(self.port, timeout=timeout, process=self.process)
+        if not info:
+            self.stop()
+            raise RuntimeError(f"浏览器未能在 {timeout} 秒内开放调试端口 {self.port}")
+
+        print(f"✅ 浏览器已就绪: {info.get('Browser', '?')}（{time.monotonic() - started:.2f} 秒）")
+        return info
+
+    def ensure_running(self, timeout=15):
+        """
+        确保浏览器在运行：端口已可用时直接复用，否则启动（或重启）。
+        由本管理器启动的进程仍在运行时绝不终止它（端口可能只是暂时无响应）
+
+        Returns:
+            版本信息字典；进程仍在运行但端口暂无响应时返回None
+        """
+        with self._lock:
+            info = get_browser_version(self.port)
+            if info:
+                return info
+            if self.process is not None and self.process.poll() is None:
+                print("⚠️ 浏览器进程仍在运行，但调试端口暂无响应")
+                return None
+            if self.process is not None:
+                print("⚠️ 浏览器已退出，正在重启...")
+                self.restarts += 1
+                self.stop()
+            return self.start(timeout=timeout)
+
+    def ensure_booking_tab(self):
+        """确保存在预订标签页，返回标签页信息字典"""
+        self.ensure_running()
+        return find_or_open_booking_tab(self.port, self.url)
+
+    def stop(self):
+        """停止由本管理器启动的浏览器进程"""
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+
+    def start_watchdog(self, interval=1.0, max_failures=5):
+        """
+        启动后台线程，浏览器退出时自动重启。
+        开放时 DevTools 端口可能短暂无响应，只有进程确实已退出、或（不是本管理器启动的浏览器）
+        连续 max_failures 次探测失败时才重启；仍在运行的进程绝不会被终止
+        """
+        if self._watchdog and self._watchdog.is_alive():
+            return
+        self._stop_event.clear()
+
+        def _run():
+            failures = 0
+            while not self._stop_event.wait(interval):
+                if self.process is not None:
+                    if self.process.poll() is None:
+                        continue
+                    restart = True
+                else:
+                    failures = 0 if self.is_alive() else failures + 1
+                    restart = failures >= max_failures
+                if restart:
+                    failures = 0
+                    try:
+                        self.ensure_running()
+                        find_or_open_booking_tab(self.port, self.url)
+                    except Exception as e:
+                        print(f"❌ 自动重启失败: {e}")
+
+        self._watchdog = threading.Thread(target=_run, name="browser-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop_watchdog(self):
+        """停止后台监控线程"""
+        self._stop_event.set()
+        if self._watchdog:
+            self._watchdog.join(timeout=2)
+            self._watchdog = None
+
+
+def check(port=DEFAULT_PORT, url=BOOKING_URL):
+    """检查浏览器和预订标签页状态，返回是否可以运行预订脚本"""
+    info = get_browser_version(port)
+    if not info:
+        print(f"❌ 端口 {port} 上没有可连接的浏览器")
+        print("请运行: python browser_manager.py start")
+        return False
+
+    print(f"✅ 浏览器正在监听远程调试端口 {port}: {info.get('Browser', '?')}")
+    tab = find_booking_tab(port, url)
+    if tab:
+        print(f"✅ 找到预订标签页: {tab.get('title', '')} ({tab.get('url', '')})")
+    else:
+        print("⚠️ 未找到预订标签页，可运行: python browser_manager.py start")
+    return True
+
+
+def main(argv=None):
+    """命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="管理远程调试模式的 Edge / Chromium 浏览器")
+    parser.add_argument("command", choices=["start", "check", "watch"], nargs="?", default="start",
+                        help="start: 启动并打开预订页，保持运行、浏览器退出后自动重启；check: 检查状态；"
+                             "watch: 同 start（保留的旧命令）")
+    parser.add_argument("--browser", default="edge", help="edge、chromium 或可执行文件路径")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--user-data-dir", default=DEFAULT_USER_DATA_DIR)
+    parser.add_argument("--headless", action="store_true", help="无界面模式")
+    parser.add_argument("--url", default=BOOKING_URL)
+    parser.add_argument("--no-watchdog", action="store_true",
+                        help="启动后立即退出，不监控浏览器（浏览器退出后不会自动重启）")
+    args = parser.parse_args(argv)
+
+    if args.command == "check":
+        return 0 if check(args.port, args.url) else 1
+
+    manager = BrowserManager(browser=args.browser, port=args.port, user_data_dir=args.user_data_dir,
+                             headless=args.headless, url=args.url)
+    try:
+        manager.ensure_running()
+        tab = manager.ensure_booking_tab()
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
+
+    print(f"✅ 预订标签页: {tab.get('url', '')}")
+    print(f"使用用户数据目录: {args.user_data_dir}")
+
+    print("\n下一步：")
+    print("1. 在浏览器中登录你的账户")
+    print("2. 选择好要预订的日期")
+    print("3. 然后在另一个终端运行: python tennis_booking.py")
+
+    if args.no_watchdog:
+        return 0
+    print("\n👀 正在监控浏览器，退出后会自动重启（保持此窗口运行，Ctrl+C 结束）")
+    manager.start_watchdog()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        manager.stop_watchdog()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
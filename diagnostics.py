@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+失败诊断采集
+预订失败时只在关键路径上做一次轻量采集：还要重试时只用一次 execute_script 读取截断的时间表 HTML
+和控制台日志；最后一次失败（之后不再重试）时才读取完整 HTML 并截图。写文件交给后台线程，
+并且等当前尝试结束、进入下一次尝试后才写，不拖慢重试。同时保存最近 N 条 trace 事件，便于事后复现
+"""
+
+import base64
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# 最近的 trace 事件（进程内全局，开销只是一次 deque.append）
+TRACE_EVENTS = deque(maxlen=500)
+
+
+def trace(event, **fields):
+    """记录一条 trace 事件"""
+    TRACE_EVENTS.append((time.time(), event, fields))
+
+
+# 把 console.* 输出额外保存在 window.__tbConsole 中，供失败时读取
+CONSOLE_HOOK_SCRIPT = """
+if (!window.__tbConsole) {
+    window.__tbConsole = [];
+    ["log", "info", "warn", "error"].forEach(function (level) {
+        var original = console[level];
+        console[level] = function () {
+            try {
+                var args = Array.prototype.slice.call(arguments).map(function (a) {
+                    try { return typeof a === "string" ? a : JSON.stringify(a); } catch (e) { return String(a); }
+                });
+                window.__tbConsole.push({t: Date.now(), level: level, msg: args.join(" ")});
+                if (window.__tbConsole.length > 200) { window.__tbConsole.shift(); }
+            } catch (e) {}
+            return original.apply(console, arguments);
+        };
+    });
+    window.addEventListener("error", function (e) {
+        window.__tbConsole.push({t: Date.now(), level: "uncaught", msg: String(e.message)});
+    });
+}
+return true;
+"""
+
+# 一次往返读取诊断所需的页面状态（arguments[0] 为 HTML 的最大长度，0 表示不截断）
+SNAPSHOT_SCRIPT = """
+var limit = arguments[0] || 0;
+function clip(html) { return limit && html.length > limit ? html.slice(0, limit) : html; }
+var grid = document.querySelector("button[data-value][onclick='toggleCourt(this)']");
+var container = grid ? (grid.closest("table") || grid.parentElement.parentElement) : null;
+var dialogs = Array.prototype.map.call(
+    document.querySelectorAll("div[role='dialog'], .modal, .popup, [class*='dialog'], [class*='modal']"),
+    function (d) { return d.offsetParent !== null ? clip(d.outerHTML) : null; }).filter(Boolean);
+return {
+    url: location.href,
+    title: document.title,
+    gridHtml: clip(container ? container.outerHTML : document.body.outerHTML),
+    dialogs: dialogs,
+    console: (window.__tbConsole || []).slice()
+};
+"""
+
+# 还要重试时时间表 HTML 的最大长度
+RETRY_SNAPSHOT_LIMIT = 20000
+
+
+def _slug(text):
+    """把原因转换为适合做目录名的字符串"""
+    keep = [c if c.isalnum() or c in "-_" else "_" for c in text]
+    return "".join(keep)[:40] or "failure"
+
+
+class DiagnosticsRecorder:
+    """
+    失败诊断采集器
+
+    用法:
+        recorder = DiagnosticsRecorder()
+        recorder.install(driver)
+        recorder.next_attempt(1)
+        ...
+        recorder.capture(driver, "no_slots", "未能选择足够的时间段")
+        recorder.next_attempt(2)   # 此时后台线程才开始写上一次尝试的文件
+        ...
+        recorder.flush()           # 流程结束，最后一次尝试的采集也可以写入
+        recorder.close()           # 写完剩余内容
+
+    Args:
+        base_dir: 诊断文件根目录，每次运行在其中新建一个以时间命名的子目录
+        screenshot: 是否截图（截图是一次同步 WebDriver 调用，约几十到一两百毫秒）
+        trace_events: 每次失败保存最近多少条 trace 事件
+    """
+
+    def __init__(self, base_dir="diagnostics", screenshot=True, trace_events=50):
+        self.run_dir = os.path.join(base_dir, datetime.now().strftime("%Y%m%d-%H%M%S"))
+        self.screenshot = screenshot
+        self.trace_events = trace_events
+        self.attempt = 0
+        self.sequence = 0       # 只增不减的尝试序号，跨多次预订流程（如监控模式）也不会回退
+        self.captured = 0
+        self._pending = queue.Queue()
+        self._cond = threading.Condition()
+        self._closing = False
+        self._thread = None
+
+    def install(self, driver):
+        """在页面中安装控制台日志钩子"""
+        try:
+            driver.execute_script(CONSOLE_HOOK_SCRIPT)
+        except Exception as e:
+            print(f"⚠️ 安装控制台日志钩子失败: {e}")
+
+    def next_attempt(self, attempt):
+        """标记进入新的尝试，之前尝试的采集可以开始写入"""
+        with self._cond:
+            self.attempt = attempt
+            self.sequence += 1
+            self._cond.notify_all()
+        trace("attempt", attempt=attempt)
+
+    def flush(self):
+        """标记当前流程结束，已采集的内容都可以开始写入（不等待写完）"""
+        with self._cond:
+            self.sequence += 1
+            self._cond.notify_all()
+
+    def capture(self, driver, reason, message="", final=True):
+        """
+        采集一次失败现场（只读取数据，不写文件）
+
+        Args:
+            driver: WebDriver
+            reason: 简短的失败原因（用于目录名）
+            message: 失败说明
+            final: 之后是否不再重试；还要重试时只读取截断的时间表 HTML，不截图
+        """
+        trace("failure", reason=reason, message=message)
+        item = {
+            "attempt": self.attempt,
+            "sequence": self.sequence,
+            "reason": reason,
+            "message": message,
+            "time": datetime.now().isoformat(timespec="milliseconds"),
+            "trace": list(TRACE_EVENTS)[-self.trace_events:],
+        }
+        try:
+            item["page"] = driver.execute_script(SNAPSHOT_SCRIPT, 0 if final else RETRY_SNAPSHOT_LIMIT)
+        except Exception as e:
+            item["page_error"] = str(e)
+        if self.screenshot and final:
+            try:
+                item["screenshot"] = driver.get_screenshot_as_base64()
+            except Exception as e:
+                item["screenshot_error"] = str(e)
+
+        self.captured += 1
+        item["seq"] = self.captured
+        self._pending.put(item)
+        self._ensure_writer()
+
+    def _ensure_writer(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._writer, name="diagnostics-writer", daemon=True)
+            self._thread.start()
+
+    def _writer(self):
+        """后台线程：等采集所在的尝试结束后再写文件"""
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            with self._cond:
+                while not self._closing and self.sequence <= item["sequence"]:
+                    self._cond.wait()
+            try:
+                self._write(item)
+            except Exception as e:
+                print(f"⚠️ 写入诊断文件失败: {e}")
+
+    def _write(self, item):
+        """把一次采集写入 run_dir/<尝试>-<序号>-<原因>/"""
+        folder = os.path.join(self.run_dir, f"{item['attempt']:02d}-{item['seq']:03d}-{_slug(item['reason'])}")
+        os.makedirs(folder, exist_ok=True)
+
+        page = item.get("page") or {}
+        if page.get("gridHtml"):
+            with open(os.path.join(folder, "grid.html"), "w", encoding="utf-8") as f:
+                f.write(page["gridHtml"])
+        for i, dialog in enumerate(page.get("dialogs", []), 1):
+            with open(os.path.join(folder, f"dialog-{i}.html"), "w", encoding="utf-8") as f:
+                f.write(dialog)
+        if item.get("screenshot"):
+            with open(os.path.join(folder, "screenshot.png"), "wb") as f:
+                f.write(base64.b64decode(item["screenshot"]))
+
+        with open(os.path.join(folder, "console.json"), "w", encoding="utf-8") as f:
+            json.dump(page.get("console", []), f, ensure_ascii=False, indent=2)
+        with open(os.path.join(folder, "trace.json"), "w", encoding="utf-8") as f:
+            events = [{"time": datetime.fromtimestamp(t).isoformat(timespec="milliseconds"), "event": e, **fields}
+                      for t, e, fields in item["trace"]]
+            json.dump(events, f, ensure_ascii=False, indent=2, default=str)
+
+        info = {k: item.get(k) for k in ("attempt", "reason", "message", "time", "page_error", "screenshot_error")}
+        info.update({"url": page.get("url"), "title": page.get("title")})
+        with open(os.path.join(folder, "info.json"), "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False, indent=2)
+
+    def close(self, timeout=10):
+        """写完所有采集并结束后台线程"""
+        if self._thread is None:
+            return
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._pending.put(None)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+        if self.captured:
+            print(f"\n🩺 已保存 {self.captured} 份失败诊断到: {self.run_dir}")
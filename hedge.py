@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+对冲刷新（hedged refresh）
+开放时服务器负载最高，refreshDayView() 的耗时波动也最大。在同一日期上保持第二个预订标签页：
+先在主标签页刷新，若 hedge_delay 秒后还没完成，再在备用标签页发起刷新，
+哪个标签页先拿到新的时间表就在哪个标签页里继续预订。
+刷新完成由页面内的 MutationObserver 判定（旧按钮全部被替换），不再固定等待 2 秒
+"""
+
+import statistics
+import time
+
+# 标记旧按钮，安装 MutationObserver，然后发起刷新；完成时间写入 window.__tbRefreshDone（Date.now()）
+START_SCRIPT = """
+var selector = "button[data-value][onclick='toggleCourt(this)']";
+var old = document.querySelectorAll(selector);
+for (var i = 0; i < old.length; i++) { old[i].setAttribute("data-tb-stale", "1"); }
+window.__tbRefreshDone = null;
+window.__tbRefreshStart = Date.now();
+if (window.__tbObserver) { window.__tbObserver.disconnect(); }
+function finished() {
+    return document.querySelector(selector) && !document.querySelector(selector + "[data-tb-stale]");
+}
+window.__tbObserver = new MutationObserver(function () {
+    if (finished()) {
+        window.__tbRefreshDone = Date.now();
+        window.__tbObserver.disconnect();
+    }
+});
+window.__tbObserver.observe(document.body, {childList: true, subtree: true, attributes: true,
+                                           attributeFilter: ["data-value", "class"]});
+if (typeof window.refreshDayView !== "function") { return false; }
+refreshDayView();
+return true;
+"""
+
+DONE_SCRIPT = "return window.__tbRefreshDone || null;"
+
+
+class HedgedRefresher:
+    """
+    在两个标签页之间对冲刷新
+
+    Args:
+        driver: WebDriver
+        primary: 主标签页窗口句柄
+        hedge: 备用标签页窗口句柄（同一日期）
+        hedge_delay: 主标签页多少秒未完成时发起对冲刷新
+        timeout: 两个标签页都未完成时最多等待多少秒（之后按原流程继续）
+        poll_interval: 轮询间隔（秒）
+    """
+
+    def __init__(self, driver, primary, hedge, hedge_delay=0.3, timeout=3, poll_interval=0.02):
+        self.driver = driver
+        self.handles = {"primary": primary, "hedge": hedge}
+        self.hedge_delay = hedge_delay
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.current = primary
+        self.records = []
+        self._pending = None
+
+    def _switch(self, name):
+        handle = self.handles[name]
+        if self.current != handle:
+            self.driver.switch_to.window(handle)
+            self.current = handle
+
+    def _start(self, name):
+        self._switch(name)
+        self.driver.execute_script(START_SCRIPT)
+        return time.time()
+
+    def _done_at(self, name):
+        """读取标签页的刷新完成时间（秒），未完成时返回None"""
+        self._switch(name)
+        done = self.driver.execute_script(DONE_SCRIPT)
+        return done / 1000 if done else None
+
+    def _collect_pending(self):
+        """补记上一次输掉的标签页的完成时间（不在关键路径上时调用）"""
+        if not self._pending:
+            return
+        record, loser_handle = self._pending
+        self._pending = None
+        loser = "primary" if self.handles["primary"] == loser_handle else "hedge"
+        try:
+            done = self._done_at(loser)
+        except Exception:
+            done = None
+        if done:
+            record["loser_latency"] = done - record["started"]
+
+    def refresh(self):
+        """
+        对冲刷新，返回后 driver 已切换到先完成的标签页
+
+        Returns:
+            先完成的标签页名 "primary" / "hedge"；都超时时返回None
+        """
+        # 上次获胜的标签页作为这次的主标签页，另一个作为备用
+        active = self.current
+        self._collect_pending()
+        if active == self.handles["hedge"]:
+            self.handles["primary"], self.handles["hedge"] = self.handles["hedge"], self.handles["primary"]
+
+        started = self._start("primary")
+        hedged = False
+        winner = None
+        finished_at = None
+        while time.time() - started < self.timeout:
+            finished_at = self._done_at("primary")
+            if finished_at:
+                winner = "primary"
+                break
+            if not hedged and time.time() - started >= self.hedge_delay:
+                self._start("hedge")
+                hedged = True
+            if hedged:
+                finished_at = self._done_at("hedge")
+                if finished_at:
+                    winner = "hedge"
+                    break
+            time.sleep(self.poll_interval)
+
+        record = {"started": started, "hedged": hedged, "winner": winner,
+                  "latency": (finished_at - started) if finished_at else None}
+        self.records.append(record)
+        if winner:
+            self._switch(winner)
+            if hedged:
+                self._pending = (record, self.handles["hedge" if winner == "primary" else "primary"])
+            print(f"🔄 刷新完成（{'备用' if winner == 'hedge' else '主'}标签页，{record['latency'] * 1000:.0f} ms）")
+        else:
+            self._switch("primary")
+            print(f"⚠️ {self.timeout} 秒内两个标签页都未完成刷新")
+        return winner
+
+    def report(self):
+        """打印对冲统计：对冲触发次数、对冲获胜次数、节省的尾部延迟"""
+        self._collect_pending()
+        if not self.records:
+            return
+
+        latencies = sorted(r["latency"] for r in self.records if r["latency"] is not None)
+        hedged = [r for r in self.records if r["hedged"]]
+        timeouts = [r for r in self.records if r["winner"] is None]
+        wins = [r for r in hedged if r["winner"] == "hedge"]
+        saved = [r["loser_latency"] - r["latency"] for r in wins if r.get("loser_latency")]
+
+        print(f"\n📈 对冲刷新统计：")
+        print(f"   刷新次数: {len(self.records)}，触发对冲: {len(hedged)}，对冲获胜: {len(wins)}，"
+              f"两个标签页都超时: {len(timeouts)}（每次多等 {self.timeout} 秒）")
+        if latencies:
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            print(f"   刷新耗时: 中位数 {statistics.median(latencies) * 1000:.0f} ms，P95 {p95 * 1000:.0f} ms")
+        if saved:
+            print(f"   对冲获胜时节省: 平均 {statistics.mean(saved) * 1000:.0f} ms，最多 {max(saved) * 1000:.0f} ms")
+        elif wins:
+            print("   对冲获胜时主标签页未在统计前完成，节省时间至少为对冲完成后的剩余等待")
+
+
+def find_hedge_tab(driver, primary, expected_date, url_prefix="https://members.swtc.ca/booking.html"):
+    """
+    查找可作为备用的第二个预订标签页（页面上显示 expected_date 的标签页）
+
+    Returns:
+        窗口句柄；找不到时返回None
+    """
+    from preflight import date_patterns
+
+    try:
+        for handle in driver.window_handles:
+            if handle == primary:
+                continue
+            driver.switch_to.window(handle)
+            if not driver.current_url.startswith(url_prefix):
+                continue
+            text = driver.execute_script("return document.body ? document.body.innerText : '';")
+            if any(p in text for p in date_patterns(expected_date)):
+                return handle
+    finally:
+        driver.switch_to.window(primary)
+    return None
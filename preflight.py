@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+预订前的预检和预热
+在定时模式等待期间运行：检查标签页仍在预订页面、日期正确、登录未过期，
+用轻量请求保持到 members.swtc.ca 的 TCP/TLS 连接，并把当天视图滚动到可见位置。
+任何检查失败都会提前报警，留出时间手动修复
+"""
+
+import time
+from datetime import datetime
+
+BOOKING_URL = "https://members.swtc.ca/booking.html#"
+
+REQUEST_TIMEOUT = 2.5     # 探测/预热请求的超时（秒），超时后由 AbortController 中止
+
+# 一次性读取页面状态，避免多次 WebDriver 往返
+PAGE_STATE_SCRIPT = """
+var grid = document.querySelectorAll("button[data-value][onclick='toggleCourt(this)']");
+var password = document.querySelector("input[type='password']");
+return {
+    url: location.href,
+    text: document.body ? document.body.innerText.slice(0, 20000) : "",
+    gridButtons: grid.length,
+    hasRefresh: typeof window.refreshDayView === "function",
+    hasBook: typeof window.book === "function",
+    loginForm: !!(password && password.offsetParent !== null)
+};
+"""
+
+# 带 cookie 请求当前页面：既验证登录状态，也让浏览器保持连接（arguments[0] 为超时毫秒数）
+SESSION_PROBE_SCRIPT = """
+var done = arguments[arguments.length - 1];
+var started = performance.now();
+var controller = new AbortController();
+var timer = setTimeout(function () { controller.abort(); }, arguments[0]);
+fetch(location.href.split("#")[0], {credentials: "include", cache: "no-store", redirect: "follow",
+                                    signal: controller.signal})
+    .then(function (r) {
+        return r.text().then(function (body) {
+            clearTimeout(timer);
+            done({status: r.status, url: r.url, redirected: r.redirected,
+                  loginPage: /type=["']?password/i.test(body),
+                  ms: performance.now() - started});
+        });
+    })
+    .catch(function (e) { clearTimeout(timer); done({error: String(e), ms: performance.now() - started}); });
+"""
+
+# 只请求响应头，开销最小（arguments[0] 为超时毫秒数）
+WARM_SCRIPT = """
+var done = arguments[arguments.length - 1];
+var started = performance.now();
+var controller = new AbortController();
+var timer = setTimeout(function () { controller.abort(); }, arguments[0]);
+fetch(location.origin + "/", {method: "HEAD", credentials: "include", cache: "no-store",
+                              signal: controller.signal})
+    .then(function (r) { clearTimeout(timer); done({status: r.status, ms: performance.now() - started}); })
+    .catch(function (e) { clearTimeout(timer); done({error: String(e), ms: performance.now() - started}); });
+"""
+
+FOCUS_GRID_SCRIPT = """
+var btn = document.querySelector("button[data-value][onclick='toggleCourt(this)']");
+if (!btn) { return false; }
+btn.scrollIntoView({block: "center"});
+return true;
+"""
+
+
+def date_patterns(date):
+    """页面上可能出现的日期写法"""
+    return {
+        date.strftime("%Y-%m-%d"),
+        date.strftime("%Y/%m/%d"),
+        date.strftime("%b %d").replace(" 0", " "),
+        date.strftime("%B %d").replace(" 0", " "),
+        date.strftime("%d %b").lstrip("0"),
+        date.strftime("%d %B").lstrip("0"),
+        f"{date.month}/{date.day}/{date.year}",
+        f"{date.day}/{date.month}/{date.year}",
+    }
+
+
+def alert(message):
+    """终端报警（响铃 + 醒目输出）"""
+    print(f"\n\a🚨 预检失败: {message}", flush=True)
+
+
+def check_page(driver, expected_date=None, url=BOOKING_URL):
+    """
+    检查标签页是否在预订页面，以及日期和时间表是否正确
+
+    Args:
+        driver: WebDriver
+        expected_date: 期望选中的日期（date 对象），None 时不检查
+        url: 预订页面 URL
+
+    Returns:
+        问题描述列表，空列表表示检查通过
+    """
+    problems = []
+    state = driver.execute_script(PAGE_STATE_SCRIPT)
+
+    if not state["url"].startswith(url.split("#", 1)[0]):
+        problems.append(f"标签页不在预订页面: {state['url']}")
+        return problems
+    if state["loginForm"]:
+        problems.append("页面上出现登录表单，登录可能已过期")
+    if not state["hasRefresh"] or not state["hasBook"]:
+        problems.append("页面缺少 refreshDayView()/book() 函数")
+    if state["gridButtons"] == 0:
+        problems.append("未找到时间表按钮（当天视图未加载？）")
+    if expected_date and not any(p in state["text"] for p in date_patterns(expected_date)):
+        problems.append(f"页面上未找到日期 {expected_date.isoformat()}，请确认已选择正确的日期")
+    return problems
+
+
+def check_session(driver, timeout=REQUEST_TIMEOUT):
+    """
+    带 cookie 请求预订页面，检查登录状态
+
+    Args:
+        timeout: 请求超时（秒）
+
+    Returns:
+        (问题描述或None, 耗时毫秒)
+    """
+    result = driver.execute_async_script(SESSION_PROBE_SCRIPT, int(timeout * 1000))
+    if result.get("error"):
+        return f"请求预订页面失败: {result['error']}", result.get("ms", 0)
+    if result["status"] >= 400:
+        return f"预订页面返回 HTTP {result['status']}", result["ms"]
+    if result["loginPage"] or "login" in result["url"].lower():
+        return "会话已过期（被重定向到登录页）", result["ms"]
+    return None, result["ms"]
+
+
+def warm_connection(driver, timeout=REQUEST_TIMEOUT):
+    """发送一个 HEAD 请求保持连接，返回耗时毫秒（失败或超时返回None）"""
+    result = driver.execute_async_script(WARM_SCRIPT, int(timeout * 1000))
+    if result.get("error"):
+        return None
+    return result["ms"]
+
+
+def focus_day_view(driver):
+    """把当天视图滚动到可见位置"""
+    return bool(driver.execute_script(FOCUS_GRID_SCRIPT))
+
+
+class Preflight:
+    """
+    在等待目标时间期间周期性运行的预检
+
+    作为 wait_until_target_time 的 on_tick 回调：
+        preflight = Preflight(driver, expected_date=date(2026, 10, 26))
+        wait_until_target_time(8, 15, 1, on_tick=preflight)
+
+    Args:
+        driver: WebDriver
+        expected_date: 期望选中的日期
+        check_leads: 在距离目标时间多少秒时做完整检查（从大到小）
+        warm_interval: 预热请求的间隔（秒）
+        quiet_window: 目标时间前多少秒内不再做任何操作，避免占用关键时刻
+            （至少为请求超时加 1 秒，保证最慢的请求也在目标时间前结束）
+        request_timeout: 探测/预热请求的超时（秒）
+    """
+
+    def __init__(self, driver, expected_date=None, check_leads=(300, 120, 30),
+                 warm_interval=15, quiet_window=3, request_timeout=REQUEST_TIMEOUT):
+        self.driver = driver
+        self.expected_date = expected_date
+        self.check_leads = sorted(check_leads, reverse=True)
+        self.warm_interval = warm_interval
+        self.request_timeout = request_timeout
+        self.quiet_window = max(quiet_window, request_timeout + 1)
+        self.last_warm = 0.0
+        self.done_leads = set()
+        self.failures = []
+        self.first_tick = True
+
+    def run_checks(self):
+        """执行一次完整检查，返回问题描述列表"""
+        try:
+            problems = check_page(self.driver, self.expected_date)
+            if not problems:
+                session_problem, ms = check_session(self.driver, self.request_timeout)
+                if session_problem:
+                    problems.append(session_problem)
+                else:
+                    print(f"\n✅ 预检通过（会话有效，请求耗时 {ms:.0f} ms）", flush=True)
+                focus_day_view(self.driver)
+        except Exception as e:
+            problems = [f"预检出错: {e}"]
+
+        for problem in problems:
+            alert(problem)
+        self.failures.extend(problems)
+        return problems
+
+    def __call__(self, remaining):
+        """
+        每次等待循环调用一次
+
+        Args:
+            remaining: 距离目标时间的秒数
+        """
+        if remaining <= self.quiet_window:
+            return
+
+        # 启动时先检查一次，之后在每个提前量到达时各检查一次
+        due = [lead for lead in self.check_leads if remaining <= lead and lead not in self.done_leads]
+        if self.first_tick or due:
+            self.first_tick = False
+            self.done_leads.update(due)
+            self.run_checks()
+            self.last_warm = time.monotonic()
+            return
+
+        if time.monotonic() - self.last_warm >= self.warm_interval:
+            self.last_warm = time.monotonic()
+            try:
+                if warm_connection(self.driver, self.request_timeout) is None:
+                    alert(f"预热请求失败（{datetime.now().strftime('%H:%M:%S')}），请检查网络")
+            except Exception as e:
+                alert(f"预热请求出错: {e}")
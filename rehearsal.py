@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+预订彩排（dry run）
+在开放时间前几秒完整走一遍预订路径但不提交：
+刷新 → 扫描/规划/选择时间段 → 点击 Book → 取消确认框 → 通过 toggleCourt 取消选择。
+检查每个选择器和页面 JS 函数都能找到，同时预热这些代码路径，并报告每一步的耗时
+"""
+
+import time
+
+# 预订路径依赖的页面函数和元素
+PAGE_PATHS_SCRIPT = """
+function visible(sel) {
+    var el = document.querySelector(sel);
+    return !!(el && el.offsetParent !== null);
+}
+return {
+    "refreshDayView()": typeof window.refreshDayView === "function",
+    "toggleCourt()": typeof window.toggleCourt === "function",
+    "book()": typeof window.book === "function",
+    "bookSubmit()": typeof window.bookSubmit === "function",
+    "刷新按钮": visible("i[onclick='refreshDayView()']"),
+    "时间段按钮": !!document.querySelector("button[data-value][onclick='toggleCourt(this)']"),
+    "Book 按钮": visible("a[onclick='book()']")
+};
+"""
+
+CONFIRM_VISIBLE_SCRIPT = """
+var el = document.querySelector("a[onclick='bookSubmit()']");
+return !!(el && el.offsetParent !== null);
+"""
+
+# 取消失败时尽量关闭确认框：点击同一弹出窗口中的关闭/取消元素，再发送 Escape；返回确认框是否仍然可见
+CLOSE_DIALOG_SCRIPT = """
+function visible(el) { return !!(el && el.offsetParent !== null); }
+var submit = document.querySelector("a[onclick='bookSubmit()']");
+if (!visible(submit)) { return false; }
+var box = submit.closest("div[role='dialog'], .modal, .popup, [class*='dialog'], [class*='modal']") || submit.parentElement;
+var candidates = box.querySelectorAll("a, button, span, [data-dismiss]");
+for (var i = 0; i < candidates.length; i++) {
+    var el = candidates[i];
+    var text = (el.textContent || "").trim().toLowerCase();
+    if (el === submit || !visible(el)) { continue; }
+    if (["no", "cancel", "close", "×", "x"].indexOf(text) >= 0 || el.hasAttribute("data-dismiss")
+            || /close/i.test(el.className)) {
+        el.click();
+        break;
+    }
+}
+document.dispatchEvent(new KeyboardEvent("keydown", {key: "Escape", keyCode: 27, bubbles: true}));
+return visible(submit);
+"""
+
+
+class StepTimer:
+    """记录每一步的耗时"""
+
+    def __init__(self):
+        self.steps = []
+
+    def run(self, name, func, *args, **kwargs):
+        """执行一步并记录耗时，返回函数结果"""
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.steps.append((name, (time.perf_counter() - started) * 1000))
+
+    def report(self):
+        """打印每一步的耗时"""
+        print(f"\n⏱️ 彩排各步骤耗时：")
+        for name, ms in self.steps:
+            print(f"   {name:<16} {ms:8.1f} ms")
+        print(f"   {'合计':<16} {sum(ms for _, ms in self.steps):8.1f} ms")
+
+
+def check_page_paths(driver):
+    """检查页面 JS 函数和关键元素，返回缺失项列表"""
+    paths = driver.execute_script(PAGE_PATHS_SCRIPT)
+    return [name for name, ok in paths.items() if not ok]
+
+
+def select_any_slot(driver):
+    """
+    选择页面上任意一个可用时间段（不限场地和时间范围）。
+    开放前目标日期在偏好范围内通常还没有可用时间段，用它走完 Book/取消/取消选择的路径
+
+    Returns:
+        选中的数量（0 或 1）
+    """
+    import tennis_booking
+
+    for btn, data_value in driver.execute_script(tennis_booking.AVAILABLE_SLOTS_SCRIPT):
+        parsed = tennis_booking.parse_slot_value(data_value)
+        if not parsed:
+            continue
+        start, end, court_num = parsed
+        time_display = f"{tennis_booking.format_minutes(start)}-{tennis_booking.format_minutes(end)} 球场{court_num}"
+        count, _ = tennis_booking.click_slots(driver, [tennis_booking.Slot(btn, time_display, start, court_num, end)], 1)
+        return count
+    return 0
+
+
+def close_dialog(driver):
+    """尽量关闭仍然打开的确认框，返回确认框是否已关闭"""
+    try:
+        return not driver.execute_script(CLOSE_DIALOG_SCRIPT)
+    except Exception:
+        return False
+
+
+def run_rehearsal(driver, num_slots=2, court_numbers=[6, 7, 8, 9, 10], hour_range=(14, 21)):
+    """
+    执行一次不提交的完整预订彩排
+
+    Args:
+        driver: WebDriver
+        num_slots: 要选择的时间段数量
+        court_numbers: 场地号码
+        hour_range: 时间范围 (开始, 结束)
+
+    Returns:
+        {"ok": 是否全部通过, "problems": [问题描述, ...], "notes": [说明, ...], "steps": [(步骤, 毫秒), ...]}
+    """
+    import tennis_booking
+    from preflight import alert
+
+    print("\n" + "="*60)
+    print("🎭 预订彩排（不会提交）")
+    print("="*60)
+
+    timer = StepTimer()
+    problems = []
+    notes = []
+
+    missing = timer.run("检查页面路径", check_page_paths, driver)
+    if missing:
+        problems.append(f"页面缺少: {', '.join(missing)}")
+
+    if not timer.run("刷新", tennis_booking.click_refresh_button, driver):
+        problems.append("未能点击刷新按钮")
+
+    selected, count, _ = timer.run(
+        "扫描+规划+选择", tennis_booking.select_slots, driver, num_slots,
+        court_numbers=court_numbers, time_range_start=hour_range[0], time_range_end=hour_range[1])
+
+    if not selected:
+        # 开放前偏好范围内没有可用时间段是正常的，改为选择页面上任意一个可用时间段
+        tennis_booking.deselect_slots(driver)
+        count = timer.run("选择任意时间段", select_any_slot, driver)
+        selected = count > 0
+        if selected:
+            notes.append("偏好范围内暂无可用时间段（开放前属正常），改用页面上任意一个可用时间段彩排")
+        else:
+            notes.append("页面上暂无任何可用时间段（开放前属正常），跳过 Book/取消确认框步骤")
+
+    if selected:
+        if not timer.run("点击 Book", tennis_booking.click_book_button, driver):
+            problems.append("未找到 Book 按钮")
+        else:
+            if not timer.run("确认框就绪", driver.execute_script, CONFIRM_VISIBLE_SCRIPT):
+                problems.append("确认框中未找到 bookSubmit() 链接")
+            if not timer.run("取消确认框", tennis_booking.handle_confirmation_dialog, driver, click_confirm=False):
+                problems.append("未能取消确认框（找不到 no 按钮）")
+            # 确认框还开着时开放后的预订会失败，必须在开放前关闭
+            if driver.execute_script(CONFIRM_VISIBLE_SCRIPT) and not timer.run("关闭确认框", close_dialog, driver):
+                problems.append("确认框仍然打开，请在开放前手动关闭（点 no）")
+
+    # 无论前面是否成功，都要恢复到未选择状态
+    deselected = timer.run("取消选择", tennis_booking.deselect_slots, driver)
+    if selected and deselected < count:
+        problems.append(f"只取消了 {deselected}/{count} 个时间段的选择")
+
+    timer.report()
+    for note in notes:
+        print(f"ℹ️ {note}")
+    if problems:
+        for problem in problems:
+            alert(f"彩排: {problem}")
+    else:
+        print("\n✅ 彩排通过，所有选择器和页面函数都可用")
+
+    return {"ok": not problems, "problems": problems, "notes": notes, "steps": timer.steps}
+
+
+class Rehearsal:
+    """
+    作为 wait_until_target_time 的 on_tick 回调，在目标时间前 lead 秒执行一次彩排
+
+    Args:
+        driver: WebDriver
+        lead: 目标时间前多少秒开始彩排
+        min_lead: 剩余时间少于此值时不再彩排（彩排本身需要几秒）
+        其余参数传给 run_rehearsal
+    """
+
+    def __init__(self, driver, lead=20, min_lead=8, **kwargs):
+        self.driver = driver
+        self.lead = lead
+        self.min_lead = min_lead
+        self.kwargs = kwargs
+        self.result = None
+
+    def __call__(self, remaining):
+        if self.result is not None or not (self.min_lead < remaining <= self.lead):
+            return
+        from preflight import alert
+        import tennis_booking
+
+        try:
+            self.result = run_rehearsal(self.driver, **self.kwargs)
+        except Exception as e:
+            alert(f"彩排出错: {e}")
+            self.result = {"ok": False, "problems": [str(e)], "notes": [], "steps": []}
+            # 尽量恢复到开放前的状态：关闭确认框、取消选择
+            if not close_dialog(self.driver):
+                alert("确认框可能仍然打开，请在开放前手动关闭（点 no）")
+            try:
+                tennis_booking.deselect_slots(self.driver)
+            except Exception:
+                pass
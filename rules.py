@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+循环预订规则
+例如 "每周二/四，提前 7 天，18:00-20:00，球场 7-9，2 个时间段"。
+用优先队列计算每条规则下一次的开放时刻；同一时刻开放的规则合并为一批，
+一次刷新、一次扫描、一起选择后只点一次 Book。调度状态保存在文件中，
+重启后会补跑错过的开放时刻（只要对应的打球日期还没过）
+"""
+
+import heapq
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+
+WEEKDAYS = {"mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6}
+
+DEFAULT_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules_state.json")
+
+
+def parse_rule(raw, defaults):
+    """
+    规范化一条规则
+
+    Args:
+        raw: 配置中的规则字典，如
+            {"name": "weeknight", "weekdays": ["tue", "thu"], "days_ahead": 7,
+             "hour_range": [18, 20], "courts": [7, 8, 9], "num_slots": 2}
+        defaults: tennis_booking 的配置字典，提供 courts/hour_range/num_slots/target_time 的默认值
+
+    Returns:
+        规则字典（weekdays 为整数集合，release_time 为 (时, 分, 秒)）
+
+    Raises:
+        ValueError: 规则无效
+    """
+    from slot_time import parse_time_of_day, to_minutes
+
+    if not isinstance(raw, dict):
+        raise ValueError(f"规则应为字典: {raw!r}")
+    if not raw.get("name"):
+        raise ValueError(f"规则缺少 name: {raw}")
+    try:
+        weekdays = {WEEKDAYS[str(d).lower()[:3]] for d in raw.get("weekdays", WEEKDAYS)}
+    except KeyError as e:
+        raise ValueError(f"规则 {raw['name']} 的星期无效: {e}")
+
+    rule = {
+        "name": raw["name"],
+        "weekdays": weekdays,
+        "days_ahead": int(raw.get("days_ahead", 7)),
+        "hour_range": list(raw.get("hour_range", defaults["hour_range"])),
+        "courts": list(raw.get("courts", defaults["courts"])),
+        "num_slots": int(raw.get("num_slots", defaults["num_slots"])),
+        "release_time": parse_time_of_day(raw.get("release_time", defaults["target_time"])),
+    }
+    window_start, window_end = (to_minutes(v) for v in rule["hour_range"])
+    if not weekdays or rule["days_ahead"] < 0 or rule["num_slots"] < 1 or window_start >= window_end:
+        raise ValueError(f"规则 {raw['name']} 无效: {raw}")
+    return rule
+
+
+def release_instant(rule, play_date):
+    """打球日期 play_date 的开放时刻"""
+    hour, minute, second = rule["release_time"]
+    release_date = play_date - timedelta(days=rule["days_ahead"])
+    return datetime(release_date.year, release_date.month, release_date.day, hour, minute, second)
+
+
+def next_occurrence(rule, after):
+    """
+    after 之后（不含）下一次开放
+
+    Returns:
+        (开放时刻, 打球日期)
+    """
+    play_date = after.date() + timedelta(days=rule["days_ahead"])
+    while True:
+        if play_date.weekday() in rule["weekdays"]:
+            release = release_instant(rule, play_date)
+            if release > after:
+                return release, play_date
+        play_date += timedelta(days=1)
+
+
+def missed_occurrences(rule, last_release, now):
+    """
+    last_release 之后、now 之前错过的开放（只保留打球日期还没过的）
+
+    Returns:
+        [(开放时刻, 打球日期), ...]
+    """
+    missed = []
+    release, play_date = next_occurrence(rule, last_release)
+    while release <= now:
+        if play_date >= now.date():
+            missed.append((release, play_date))
+        release, play_date = next_occurrence(rule, release)
+    return missed
+
+
+def load_state(path):
+    """读取调度状态 {规则名: {"last_release": ISO时间, ...}}"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(path, state):
+    """原子地写入调度状态"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def book_batch(driver, rules, config):
+    """
+    在当前标签页中为同一日期的多条规则一起预订：一次刷新、一次扫描、一起选择、一次 Book
+
+    Returns:
+        {规则名: [(时间显示, 球场号), ...]}
+    """
+    import tennis_booking as tb
+    from slot_time import format_minutes, to_minutes
+
+    results = {rule["name"]: [] for rule in rules}
+    courts = sorted({c for rule in rules for c in rule["courts"]})
+    windows = {rule["name"]: [to_minutes(v) for v in rule["hour_range"]] for rule in rules}
+    start = format_minutes(min(w[0] for w in windows.values()))
+    end = format_minutes(max(w[1] for w in windows.values()))
+
+    tb.click_refresh_button(driver)
+    for attempt in range(1, config["max_retries"] + 1):
+        print(f"\n{'='*60}")
+        print(f"批量预订 {', '.join(results)}（尝试 {attempt}/{config['max_retries']}）")
+        print(f"{'='*60}\n")
+
+        available = tb.find_available_slots(driver, time_range_start=start, time_range_end=end, court_numbers=courts,
+                                            settle=config["scan_settle"])
+        used = set()
+        selected_any = False
+        for rule in rules:
+            window_start, window_end = windows[rule["name"]]
+            candidates = [s for s in available if id(s.elem) not in used and s.court in rule["courts"]
+                          and window_start <= s.start and s.end <= window_end]
+            target_slots, num_slots = tb.plan_slots(candidates, rule["num_slots"])
+            count, details = tb.click_slots(driver, target_slots, num_slots)
+            used.update(id(s.elem) for s in target_slots[:count])
+            results[rule["name"]] = details
+            selected_any = selected_any or count > 0
+
+        if selected_any and tb.click_book_button(driver):
+            tb.handle_confirmation_dialog(driver, click_confirm=config["click_confirm"])
+            return results
+
+        print(f"\n⚠️ 尝试 {attempt}: 批量预订未完成")
+        tb.deselect_slots(driver)
+        results = {rule["name"]: [] for rule in rules}
+        if attempt < config["max_retries"]:
+            tb.click_refresh_button(driver)
+            time.sleep(config["retry_interval"])
+    return results
+
+
+class RuleScheduler:
+    """
+    循环规则调度器
+
+    Args:
+        rules: parse_rule 返回的规则列表
+        fire: 回调 fire(batch)，batch 为 [(规则, 打球日期), ...]，返回 {规则名: 预订详情}
+        prepare: 回调 prepare(batch)，在开放前 prepare_lead 秒调用一次（可选）
+        state_path: 调度状态文件
+        prepare_lead: 提前多少秒准备
+    """
+
+    def __init__(self, rules, fire, prepare=None, state_path=DEFAULT_STATE_PATH, prepare_lead=60):
+        self.rules = rules
+        self.fire = fire
+        self.prepare = prepare
+        self.state_path = state_path
+        self.prepare_lead = prepare_lead
+        self.state = load_state(state_path)
+        self.queue = []
+
+    def _record(self, batch, results):
+        for rule, play_date in batch:
+            self.state[rule["name"]] = {
+                "last_release": release_instant(rule, play_date).isoformat(),
+                "play_date": play_date.isoformat(),
+                "booked": results.get(rule["name"], []),
+            }
+        save_state(self.state_path, self.state)
+
+    def _fire(self, batch):
+        """调用 fire 并记录结果；出错（如标签页被关闭）时记为空结果，调度继续"""
+        try:
+            results = self.fire(batch) or {}
+        except Exception as e:
+            print(f"\n❌ 批量预订出错: {e}")
+            results = {}
+        self._record(batch, results)
+
+    def catch_up(self, now=None):
+        """
+        补跑重启前错过的开放，按打球日期分批。
+        从上一次开放（last_release）算起；还从未开放过的规则从开始调度的时刻（scheduled_since）算起
+        """
+        now = now or datetime.now()
+        by_date = {}
+        for rule in self.rules:
+            entry = self.state.get(rule["name"], {})
+            last = entry.get("last_release") or entry.get("scheduled_since")
+            if not last:
+                continue
+            for release, play_date in missed_occurrences(rule, datetime.fromisoformat(last), now):
+                by_date.setdefault(play_date, []).append((rule, play_date))
+
+        for play_date in sorted(by_date):
+            batch = by_date[play_date]
+            print(f"\n⏪ 补跑错过的规则: {', '.join(r['name'] for r, _ in batch)}（{play_date.isoformat()}）")
+            self._fire(batch)
+
+    def build_queue(self, now=None):
+        """为每条规则计算下一次开放时刻；新规则记下开始调度的时刻，重启后据此补跑"""
+        now = now or datetime.now()
+        self.queue = []
+        for index, rule in enumerate(self.rules):
+            entry = self.state.setdefault(rule["name"], {})
+            last = entry.get("last_release")
+            if not last:
+                entry.setdefault("scheduled_since", now.isoformat())
+            after = max(now, datetime.fromisoformat(last)) if last else now
+            release, play_date = next_occurrence(rule, after)
+            heapq.heappush(self.queue, (release, index, play_date))
+        save_state(self.state_path, self.state)
+
+    def pop_batch(self):
+        """取出下一个开放时刻的所有规则"""
+        release, index, play_date = heapq.heappop(self.queue)
+        batch = [(self.rules[index], play_date)]
+        while self.queue and self.queue[0][0] == release:
+            _, index, play_date = heapq.heappop(self.queue)
+            batch.append((self.rules[index], play_date))
+        return release, batch
+
+    def peek_batch(self):
+        """查看下一个开放时刻的所有规则（不取出）"""
+        release = self.queue[0][0]
+        return release, [(self.rules[i], d) for r, i, d in self.queue if r == release]
+
+    def sleep_until(self, instant):
+        """等到指定时刻；距离较远时每 30 秒醒一次"""
+        while True:
+            remaining = (instant - datetime.now()).total_seconds()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, 30))
+
+    def run(self):
+        """补跑错过的开放后一直运行"""
+        self.catch_up()
+        self.build_queue()
+
+        while self.queue:
+            release, batch = self.peek_batch()
+            names = ", ".join(f"{r['name']}({d.isoformat()})" for r, d in batch)
+            print(f"\n📅 下一次开放: {release.strftime('%Y-%m-%d %H:%M:%S')} → {names}")
+
+            if self.prepare:
+                self.sleep_until(release - timedelta(seconds=self.prepare_lead))
+                try:
+                    self.prepare(batch)
+                except Exception as e:
+                    print(f"\n⚠️ 准备失败: {e}")
+            self.sleep_until(release)
+
+            release, batch = self.pop_batch()
+            print(f"\n🚀 {release.strftime('%H:%M:%S')} 开放，批量预订 {len(batch)} 条规则")
+            self._fire(batch)
+
+            for rule, play_date in batch:
+                next_release, next_date = next_occurrence(rule, release)
+                heapq.heappush(self.queue, (next_release, self.rules.index(rule), next_date))
+
+
+class BrowserBatchRunner:
+    """
+    把规则批次落到浏览器上：准备阶段按日期找到标签页并预检，开放时按日期分组批量预订
+
+    Args:
+        driver: WebDriver
+        config: tennis_booking 的配置字典
+    """
+
+    def __init__(self, driver, config):
+        self.driver = driver
+        self.config = config
+        self.tabs = {}
+
+    def prepare(self, batch):
+        """按日期找到标签页并做一次页面检查"""
+        from preflight import alert, check_page
+        from watcher import discover_date_tabs
+
+        dates = sorted({play_date for _, play_date in batch})
+        found = discover_date_tabs(self.driver, dates)
+        self.tabs = {label: handle for handle, label in found.items()}
+        for play_date in dates:
+            handle = self.tabs.get(play_date.isoformat())
+            if not handle:
+                continue
+            self.driver.switch_to.window(handle)
+            for problem in check_page(self.driver, play_date):
+                alert(f"[{play_date.isoformat()}] {problem}")
+
+    def fire(self, batch):
+        """按日期分组批量预订"""
+        if not self.tabs:
+            self.prepare(batch)
+
+        by_date = {}
+        for rule, play_date in batch:
+            by_date.setdefault(play_date, []).append(rule)
+
+        results = {}
+        for play_date, rules in sorted(by_date.items()):
+            handle = self.tabs.get(play_date.isoformat())
+            if not handle:
+                print(f"❌ 没有 {play_date.isoformat()} 的预订标签页，跳过: {', '.join(r['name'] for r in rules)}")
+                continue
+            self.driver.switch_to.window(handle)
+            results.update(book_batch(self.driver, rules, self.config))
+        self.tabs = {}
+        return results
@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+抢订竞争模拟器
+离散事件模拟预订服务器和 N 个竞争者（各自的延迟分布、开火时间、重试策略），
+用模拟时钟替换 tennis_booking 里的 time，让真正的 select_slots / find_consecutive_slots
+在模拟的时间表上运行。对 RETRY_INTERVAL、MAX_RETRIES、开火偏移、时间段数量、扫描前等待
+（配置项 scan_settle）等参数做网格扫描，每组参数跑几千次（多进程并行），报告抢到连续 2 小时的概率
+
+用法:
+    python simulate.py --trials 2000 --competitors 20 \\
+        --fire-offset 0,0.5,1 --retry-interval 0.5,1,2 --max-retries 3,5 --slots 2 --scan-settle 2,0.3
+
+竞争者的延迟分布、开火时间和重试策略可以整体调整（--competitor-latency 等），
+也可以用 --competitor-profiles 按组指定，例如 5 个低延迟、开火很早的 "脚本党"：
+    --competitor-profiles '[{"count": 5, "latency": [0.05, 0.3], "fire": [0.1, 0.1], "retry": [0.5, 10]}]'
+
+不需要 selenium 和浏览器
+"""
+
+import contextlib
+import heapq
+import io
+import itertools
+import math
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+# 模拟时间表：所有场地 × 每小时一个时间段
+GRID_COURTS = list(range(1, 11))
+GRID_HOURS = list(range(7, 22))
+
+# 与真实流程中固定等待对应的模拟耗时（秒）
+REFRESH_WAIT = 2.0        # click_refresh_button 点击后的等待
+BOOK_CLICK_DELAY = 0.7    # click_book_button: scrollIntoView 后 0.2 + 点击后 0.5
+CONFIRM_DELAY = 0.5       # handle_confirmation_dialog 点击前的等待
+DOM_LATENCY = 0.01        # 一次读取时间表的往返
+CLICK_LATENCY = 0.003     # 一次 execute_script 点击往返
+
+DEFAULT_PARAMS = {
+    # 被扫描的参数
+    "fire_offset": 1.0,       # 相对开放时刻的开火时间（秒），对应定时模式的 target_second
+    "retry_interval": 1.0,
+    "max_retries": 5,
+    "num_slots": 2,
+    "scan_settle": 2.0,       # 刷新后扫描前的等待，对应 tennis_booking 的配置项 scan_settle
+    # 环境
+    "courts": [6, 7, 8, 9, 10],
+    "hour_range": [14, 21],
+    "competitors": 20,
+    "our_latency": (0.15, 0.5),          # 单程网络延迟 lognormal (中位数秒, sigma)
+    "competitor_latency": (0.15, 0.6),   # 以下三项为竞争者的默认值
+    "competitor_fire": (0.8, 0.6),       # 竞争者开火时间 normal (均值, 标准差)
+    "competitor_retry": (1.5, 3),        # 竞争者 (重试间隔, 最多尝试次数)
+    "competitor_profiles": [],           # 按组覆盖竞争者参数: [{"count": 5, "latency": [..], "fire": [..], "retry": [..]}]
+    "server_service": (0.02, 0.5),       # 服务器处理每个请求的时间 lognormal，串行排队
+}
+
+
+def lognormal(rng, spec):
+    """按 (中位数, sigma) 采样"""
+    median, sigma = spec
+    return median * math.exp(rng.gauss(0, sigma))
+
+
+class Simulation:
+    """
+    离散事件模拟：事件队列 + 串行处理请求的预订服务器。
+    同时提供 sleep/time/monotonic/perf_counter，替换 tennis_booking 模块中的 time，
+    让真实代码里的 time.sleep 推进模拟时钟
+    """
+
+    def __init__(self, params, seed):
+        self.params = params
+        self.rng = random.Random(seed)
+        self.now = -10.0          # 开放时刻为 0
+        self.events = []
+        self.seq = itertools.count()
+        self.server_free = -math.inf
+        self.booked = set()       # {(小时, 球场)}
+
+    # ---- 时钟接口（替换 time 模块） ----
+    def sleep(self, seconds):
+        self.advance(self.now + max(seconds, 0))
+
+    def time(self):
+        return self.now
+
+    monotonic = perf_counter = time
+
+    # ---- 事件队列 ----
+    def schedule(self, at, callback):
+        heapq.heappush(self.events, (at, next(self.seq), callback))
+
+    def advance(self, to):
+        """处理 to 之前的所有事件，然后把时钟推进到 to"""
+        while self.events and self.events[0][0] <= to:
+            at, _, callback = heapq.heappop(self.events)
+            self.now = max(self.now, at)
+            callback()
+        self.now = max(self.now, to)
+
+    def run_until_idle(self, limit=120):
+        self.advance(limit)
+
+    # ---- 服务器 ----
+    def request(self, latency, handler, on_response):
+        """
+        发送请求：上行延迟后到达服务器，排队串行处理，下行延迟后回调 on_response(结果)
+        """
+        up = lognormal(self.rng, latency)
+        down = lognormal(self.rng, latency)
+
+        def arrive():
+            start = max(self.now, self.server_free)
+            self.server_free = start + lognormal(self.rng, self.params["server_service"])
+            result = handler()
+            self.schedule(self.server_free + down, lambda: on_response(result))
+
+        self.schedule(self.now + up, arrive)
+
+    def snapshot(self):
+        """当前可预订的时间段（开放前为空）"""
+        if self.now < 0:
+            return set()
+        return {(h, c) for h in GRID_HOURS for c in GRID_COURTS} - self.booked
+
+    def book(self, slots):
+        """整单预订：开放前或任一时间段已被订走则失败"""
+        slots = set(slots)
+        if self.now < 0 or not slots or slots & self.booked:
+            return False
+        self.booked |= slots
+        return True
+
+
+class FakeElement:
+    """时间段按钮 <button data-value="1400|1500|7" class="available" onclick="toggleCourt(this)">"""
+
+    def __init__(self, hour, court):
+        self.slot = (hour, court)
+        self.selected = False
+
+    def is_displayed(self):
+        return True
+
+    def get_attribute(self, name):
+        hour, court = self.slot
+        if name == "data-value":
+            return f"{hour * 100}|{(hour + 1) * 100}|{court}"
+        if name == "class":
+            return "available selected" if self.selected else "available"
+        return None
+
+
+class FakeDriver:
+    """只实现 select_slots 用到的 WebDriver 接口；页面视图在刷新响应到达时更新"""
+
+    def __init__(self, sim, tb):
+        self.sim = sim
+        self.tb = tb
+        self.elements = []
+
+    def show(self, available):
+        # 刷新后重新渲染时间表，之前的选择被清空
+        self.elements = [FakeElement(h, c) for h, c in sorted(available)]
+
+    def find_elements(self, by, selector):
+        self.sim.sleep(DOM_LATENCY)
+        return list(self.elements)
+
+    def execute_script(self, script, *args):
+        if script == self.tb.AVAILABLE_SLOTS_SCRIPT:
+            self.sim.sleep(DOM_LATENCY)
+            return [[e, e.get_attribute("data-value")] for e in self.elements if not e.selected]
+        self.sim.sleep(CLICK_LATENCY)
+        if args and isinstance(args[0], FakeElement):
+            args[0].selected = not args[0].selected
+
+    def selected_slots(self):
+        return [e.slot for e in self.elements if e.selected]
+
+
+def competitor_specs(params):
+    """
+    每个竞争者的 {latency, fire, retry}：先按 competitor_profiles 分组，
+    不足 competitors 个时其余使用默认值
+
+    Returns:
+        [{"latency": (中位数, sigma), "fire": (均值, 标准差), "retry": (间隔, 次数)}, ...]
+    """
+    default = {"latency": params["competitor_latency"], "fire": params["competitor_fire"],
+               "retry": params["competitor_retry"]}
+    specs = []
+    for profile in params["competitor_profiles"]:
+        spec = {key: tuple(profile.get(key, value)) for key, value in default.items()}
+        specs.extend([spec] * int(profile.get("count", 1)))
+    specs.extend([default] * max(params["competitors"] - len(specs), 0))
+    return specs
+
+
+def start_competitor(sim, rng, spec, tb):
+    """按竞争者自己的延迟分布、偏好和重试策略安排事件"""
+    start = rng.choice([14, 16, 17, 18])
+    window = (start, min(start + rng.choice([2, 3, 4]), 22))
+    courts = set(rng.sample(GRID_COURTS, rng.randint(3, 7)))
+    num = 2 if rng.random() < 0.7 else 1
+    preferred = rng.choice(sorted(courts))
+    interval, max_attempts = spec["retry"]
+    state = {"attempts": 0}
+
+    def refresh():
+        state["attempts"] += 1
+        sim.request(spec["latency"], sim.snapshot, plan)
+
+    def plan(available):
+        slots = sorted((tb.Slot(None, "", h * 60, c, h * 60 + 60) for h, c in available
+                        if c in courts and window[0] <= h < window[1]), key=lambda s: (s.start, s.court))
+        chosen = tb.find_consecutive_slots(slots, num, preferred_court=preferred) if num >= 2 else None
+        chosen = chosen or slots[:1]
+        if chosen:
+            think = lognormal(rng, (0.4, 0.5))
+            sim.schedule(sim.now + think, lambda: sim.request(
+                spec["latency"], lambda: sim.book((s.start // 60, s.court) for s in chosen), done))
+        else:
+            retry()
+
+    def done(ok):
+        if not ok:
+            retry()
+
+    def retry():
+        if state["attempts"] < max_attempts:
+            sim.schedule(sim.now + interval, refresh)
+
+    sim.schedule(rng.gauss(*spec["fire"]), refresh)
+
+
+def run_trial(params, seed):
+    """
+    跑一次模拟
+
+    Returns:
+        (是否抢到连续 num_slots 个时间段, 是否抢到任意时间段, 完成时刻, 实际扫描/选择的次数)
+    """
+    import tennis_booking as tb
+
+    sim = Simulation(params, seed)
+    rng = random.Random(seed * 7919 + 1)
+    driver = FakeDriver(sim, tb)
+    real_time, tb.time = tb.time, sim
+    try:
+        for spec in competitor_specs(params):
+            start_competitor(sim, rng, spec, tb)
+
+        def refresh():
+            sim.request(params["our_latency"], sim.snapshot, driver.show)
+            sim.sleep(REFRESH_WAIT)
+
+        # 与 run_booking_flow 相同的步骤
+        result = {}
+        attempts = 0
+        sim.advance(params["fire_offset"])
+        refresh()
+        start, end = params["hour_range"]
+        for attempt in range(1, params["max_retries"] + 1):
+            attempts = attempt
+            ok, count, _ = tb.select_slots(driver, params["num_slots"], court_numbers=params["courts"],
+                                           time_range_start=start, time_range_end=end, settle=params["scan_settle"])
+            if not ok:
+                if attempt < params["max_retries"]:
+                    refresh()
+                    sim.sleep(params["retry_interval"])
+                    continue
+                break
+
+            sim.sleep(BOOK_CLICK_DELAY + CONFIRM_DELAY)
+            slots = driver.selected_slots()
+            sim.request(params["our_latency"], lambda: sim.book(slots),
+                        lambda ok: result.update(ok=ok, slots=slots, at=sim.now))
+            break
+
+        sim.run_until_idle()
+    finally:
+        tb.time = real_time
+
+    if not result.get("ok"):
+        return False, False, None, attempts
+    hours = sorted(h for h, _ in result["slots"])
+    block = len(hours) >= 2 and len({c for _, c in result["slots"]}) == 1 and hours[-1] - hours[0] == len(hours) - 1
+    return block, True, result["at"], attempts
+
+
+def run_batch(args):
+    """
+    子进程任务：对一组参数跑一批种子
+
+    Returns:
+        (连续数, 任意数, 成功完成时刻列表, 用到重试的次数, 逐次结果字符串)
+        逐次结果中 "2" 为抢到连续时间段、"1" 为只抢到部分、"0" 为失败，用于判断参数是否改变过结果
+    """
+    params, seeds = args
+    blocks = anys = retried = 0
+    times = []
+    outcomes = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for seed in seeds:
+            block, got, at, attempts = run_trial(params, seed)
+            blocks += block
+            anys += got
+            retried += attempts > 1
+            outcomes.append("2" if block else "1" if got else "0")
+            if got:
+                times.append(at)
+    return blocks, anys, times, retried, "".join(outcomes)
+
+
+def wilson(successes, n, z=1.96):
+    """二项分布的 Wilson 95% 置信区间"""
+    if n == 0:
+        return 0.0, 0.0
+    p = successes / n
+    centre = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return centre - half, centre + half
+
+
+def sweep(base, grid, trials, workers, chunk=250):
+    """
+    对参数网格做扫描
+
+    Args:
+        base: 基础参数
+        grid: {参数名: [取值, ...]}
+        trials: 每组参数的模拟次数
+
+    Returns:
+        [(参数组合, 抢到连续时间段数, 抢到任意时间段数, 成功完成时刻列表, 用到重试的次数, 逐次结果), ...]
+    """
+    names = list(grid)
+    combos = [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+    tasks = []
+    for index, combo in enumerate(combos):
+        params = dict(base, **combo)
+        for start in range(0, trials, chunk):
+            tasks.append((index, (params, range(start, min(start + chunk, trials)))))
+
+    totals = [[0, 0, [], 0, ""] for _ in combos]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for (index, _), (blocks, anys, times, retried, outcomes) in zip(tasks, pool.map(run_batch, [t for _, t in tasks])):
+            totals[index][0] += blocks
+            totals[index][1] += anys
+            totals[index][2].extend(times)
+            totals[index][3] += retried
+            totals[index][4] += outcomes
+    return [(combo, *total) for combo, total in zip(combos, totals)]
+
+
+def ineffective_params(results):
+    """
+    找出从未改变过任何一次模拟结果的参数：其余参数相同时，该参数取不同值的逐次结果完全一致
+    （各组使用相同的随机种子，所以结果相同说明这个参数没有起作用）
+    """
+    names = [n for n in results[0][0] if len({repr(r[0][n]) for r in results}) > 1]
+    ineffective = []
+    for name in names:
+        groups = {}
+        for combo, *_, outcomes in results:
+            key = tuple(repr(v) for k, v in combo.items() if k != name)
+            groups.setdefault(key, set()).add(outcomes)
+        if all(len(outcomes) == 1 for outcomes in groups.values()):
+            ineffective.append(name)
+    return ineffective
+
+
+def report(results, trials):
+    """按抢到连续时间段的概率排序输出，并标出没有起作用的参数"""
+    results = sorted(results, key=lambda r: r[1], reverse=True)
+    names = list(results[0][0])
+    header = " ".join(f"{n:>14}" for n in names)
+    print(f"\n{header} {'P(连续)':>10} {'95% CI':>15} {'P(任意)':>9} {'用到重试':>8} {'成功用时':>8}")
+    for combo, blocks, anys, times, retried, _ in results:
+        low, high = wilson(blocks, trials)
+        mean_time = f"{sum(times) / len(times):.2f}s" if times else "-"
+        values = " ".join(f"{combo[n]:>14}" for n in names)
+        print(f"{values} {blocks / trials:>10.1%} {f'[{low:.1%}, {high:.1%}]':>15} {anys / trials:>9.1%} "
+              f"{retried / trials:>8.1%} {mean_time:>8}")
+
+    ineffective = ineffective_params(results)
+    for name in ineffective:
+        print(f"\n⚠️ {name} 的不同取值没有改变任何一次模拟的结果，表中按它区分的行只是并列，不能据此选择它")
+    if all(r[4] == 0 for r in results):
+        print("⚠️ 所有模拟都没有用到重试（第一次扫描总能选中，失败只发生在提交时），"
+              "retry_interval / max_retries 无法从这组模拟中评估")
+
+    best = {k: v for k, v in results[0][0].items() if k not in ineffective}
+    tied = {tuple(repr(v) for k, v in r[0].items() if k not in ineffective)
+            for r in results if r[1] == results[0][1]}
+    note = f"（另有 {len(tied) - 1} 组并列）" if len(tied) > 1 else ""
+    print(f"\n✅ 最佳参数: {', '.join(f'{k}={v}' for k, v in best.items())}{note}")
+
+
+def parse_list(cast):
+    return lambda value: [cast(v) for v in value.split(",") if v.strip()]
+
+
+def parse_pair(value):
+    """解析 "a,b" 为 (a, b)"""
+    pair = tuple(parse_list(float)(value))
+    if len(pair) != 2:
+        raise ValueError(f"应为两个数字 a,b: {value}")
+    return pair
+
+
+def parse_profiles(value):
+    """解析竞争者分组：JSON 字符串或 JSON 文件路径"""
+    import json
+
+    if os.path.exists(value):
+        with open(value, encoding="utf-8") as f:
+            return json.load(f)
+    return json.loads(value)
+
+
+def main(argv=None):
+    """命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="抢订竞争模拟器")
+    parser.add_argument("-c", "--config", help="tennis_booking 配置文件（读取 courts、hour_range 和 scan_settle）")
+    parser.add_argument("--trials", type=int, default=2000, help="每组参数的模拟次数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="并行进程数")
+    parser.add_argument("--competitors", type=int, default=DEFAULT_PARAMS["competitors"])
+    parser.add_argument("--fire-offset", type=parse_list(float), default=[0.0, 0.5, 1.0])
+    parser.add_argument("--retry-interval", type=parse_list(float), default=[0.5, 1.0, 2.0])
+    parser.add_argument("--max-retries", type=parse_list(int), default=[3, 5])
+    parser.add_argument("--slots", type=parse_list(int), default=[2])
+    parser.add_argument("--scan-settle", type=parse_list(float), help="刷新后扫描前的等待（默认 2,0.3；"
+                        "指定 -c 时默认只用配置文件中的值）")
+    parser.add_argument("--our-latency", type=parse_pair, help="我方单程延迟 lognormal: 中位数秒,sigma")
+    parser.add_argument("--competitor-latency", type=parse_pair, help="竞争者单程延迟 lognormal: 中位数秒,sigma")
+    parser.add_argument("--competitor-fire", type=parse_pair, help="竞争者开火时间 normal: 均值,标准差")
+    parser.add_argument("--competitor-retry", type=parse_pair, help="竞争者重试策略: 间隔秒,最多尝试次数")
+    parser.add_argument("--server-service", type=parse_pair, help="服务器处理时间 lognormal: 中位数秒,sigma")
+    parser.add_argument("--competitor-profiles", type=parse_profiles,
+                        help="按组指定竞争者的 JSON 列表（或 JSON 文件路径），每组可含 count/latency/fire/retry")
+    args = parser.parse_args(argv)
+
+    base = dict(DEFAULT_PARAMS, competitors=args.competitors)
+    for key in ("our_latency", "competitor_latency", "competitor_fire", "competitor_retry", "server_service",
+                "competitor_profiles"):
+        if getattr(args, key) is not None:
+            base[key] = getattr(args, key)
+    base["competitor_retry"] = (base["competitor_retry"][0], int(base["competitor_retry"][1]))
+    scan_settle = args.scan_settle or [2.0, 0.3]
+    if args.config:
+        from tennis_booking import load_config
+        config = load_config(args.config)
+        base.update(courts=config["courts"], hour_range=config["hour_range"])
+        scan_settle = args.scan_settle or [float(config["scan_settle"])]
+
+    grid = {
+        "fire_offset": args.fire_offset,
+        "retry_interval": args.retry_interval,
+        "max_retries": args.max_retries,
+        "num_slots": args.slots,
+        "scan_settle": scan_settle,
+    }
+    combos = math.prod(len(v) for v in grid.values())
+    print(f"模拟 {combos} 组参数 × {args.trials} 次，{len(competitor_specs(base))} 个竞争者，{args.workers} 个进程...")
+    report(sweep(base, grid, args.trials, args.workers), args.trials)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
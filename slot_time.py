@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+分钟精度的时间段模型
+data-value 格式为 "开始|结束|球场"，时间是 3 位或 4 位的 HHMM（800 = 8:00，1730 = 17:30）。
+所有时间统一换算为当天的分钟数，支持半小时、90 分钟等任意长度的时间段；
+"连续" 指前一个时间段的结束时间等于下一个的开始时间
+"""
+
+from functools import lru_cache
+
+
+def parse_hhmm(text):
+    """
+    解析 HHMM（3 位或 4 位）为分钟数: "800" -> 480, "1730" -> 1050, "2400" -> 1440
+
+    Raises:
+        ValueError: 格式无效
+    """
+    text = text.strip()
+    if not text.isdigit() or not 3 <= len(text) <= 4:
+        raise ValueError(f"时间格式应为 HHMM: {text!r}")
+    hour, minute = int(text[:-2]), int(text[-2:])
+    if minute >= 60 or hour > 24 or (hour == 24 and minute):
+        raise ValueError(f"无效的时间: {text!r}")
+    return hour * 60 + minute
+
+
+def to_minutes(value):
+    """
+    把配置中的时间换算为分钟数：整数表示整点（14 -> 840），字符串为 "HH:MM"（"17:30" -> 1050）
+    """
+    if isinstance(value, int):
+        if not 0 <= value <= 24:
+            raise ValueError(f"无效的小时: {value}")
+        return value * 60
+    hour, _, minute = str(value).partition(":")
+    hour, minute = int(hour), int(minute or 0)
+    if minute >= 60 or hour > 24 or (hour == 24 and minute):
+        raise ValueError(f"无效的时间: {value}")
+    return hour * 60 + minute
+
+
+def parse_time_of_day(value):
+    """解析 "HH:MM" 或 "HH:MM:SS"，返回 (时, 分, 秒)"""
+    parts = [int(p) for p in str(value).split(":")]
+    if len(parts) == 2:
+        parts.append(0)
+    if len(parts) != 3:
+        raise ValueError(f"时间格式应为 HH:MM[:SS]: {value}")
+    hour, minute, second = parts
+    if not (0 <= hour < 24 and 0 <= minute < 60 and 0 <= second < 60):
+        raise ValueError(f"无效的时间: {value}")
+    return hour, minute, second
+
+
+def format_minutes(minutes):
+    """分钟数 -> "HH:MM" """
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+@lru_cache(maxsize=4096)
+def decode_slot_value(data_value):
+    """
+    解析一个 data-value（带缓存，刷新前后大部分字符串相同）
+
+    Returns:
+        (开始分钟, 结束分钟, 球场号)；格式无效时返回None
+    """
+    parts = data_value.split("|") if data_value else []
+    if len(parts) != 3:
+        return None
+    try:
+        start, end, court = parse_hhmm(parts[0]), parse_hhmm(parts[1]), int(parts[2])
+    except ValueError:
+        return None
+    if end <= start:
+        return None
+    return start, end, court
@@ -2,68 +2,115 @@
 """
 网球场快速预订脚本
 在已登录的预订页面上快速选择时间段并点击预订按钮
+
+Selenium 等重依赖在参数解析和校验之后才导入，便于 cron / systemd 定时启动：
+    python tennis_booking.py --mode scheduled --at 08:15:01 --courts 6-10 --hours 14-21
 """
 
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.edge.service import Service
-from selenium.webdriver.edge.options import Options
-try:
-    from webdriver_manager.microsoft import EdgeChromiumDriverManager
-    WEBDRIVER_MANAGER_AVAILABLE = True
-except ImportError:
-    WEBDRIVER_MANAGER_AVAILABLE = False
+import json
+import os
+import sys
 import time
-from datetime import datetime
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from diagnostics import trace
+from slot_time import decode_slot_value, format_minutes, parse_time_of_day, to_minutes
+
+# ========== 默认配置（可被配置文件和命令行参数覆盖） ==========
+DEFAULT_CONFIG = {
+    "mode": None,                  # now 立即 / scheduled 定时 / rehearse 只彩排 / watch 退订监控 / rules 循环规则；None 时交互询问
+    "target_time": "08:15:01",     # 定时模式的目标时间
+    "courts": [6, 7, 8, 9, 10],    # 场地号码
+    "hour_range": [14, 21],        # 时间范围，整数为整点（14 = 2pm），也可写 "17:30"；时间段需完全落在范围内
+    "num_slots": 2,                # 要预订的时间段数量
+    "max_retries": 5,              # 最大重试次数
+    "retry_interval": 1,           # 重试间隔（秒）
+    "scan_settle": 2,              # 刷新按钮点击（及其后 2 秒等待）之后、扫描时间表前再等待的秒数
+    "click_confirm": True,         # 在弹出窗口中点击确认
+    "use_existing_browser": True,  # 使用已打开的浏览器
+    "port": 9222,                  # 远程调试端口
+    "driver_path": None,           # msedgedriver 路径；设置后跳过 webdriver-manager 的版本查询
+    "preflight": True,             # 定时模式等待期间做预检和连接预热
+    "booking_date": None,          # 预检时期望页面上选中的日期 YYYY-MM-DD；None 时不检查日期
+    "rehearsal_lead": 0,           # 定时模式在目标时间前多少秒彩排一次（会真实点击 Book 再取消）；0 表示不彩排
+    "diagnostics": True,           # 失败时在后台保存截图、时间表 HTML、控制台日志和 trace
+    "diagnostics_dir": "diagnostics",
+    "diagnostics_screenshot": True,
+    "watch_dates": [],             # 监控模式要监控的日期 YYYY-MM-DD（每个日期一个标签页）；为空时监控所有预订标签页
+    "watch_interval": 60,          # 监控模式检查间隔（秒）
+    "quiet_hours": [],             # 监控模式的静默时段，如 ["23:00-06:30"]
+    "watch_max_bookings": 1,       # 监控模式成功预订多少次后退出（0 表示不限）
+    "rules": [],                   # 循环预订规则，见 rules.py
+    "rules_state": None,           # 规则调度状态文件；None 时使用脚本目录下的 rules_state.json
+    "hedge_refresh": False,        # 在同一日期的第二个预订标签页上对冲刷新
+    "hedge_delay": 0.3,            # 主标签页刷新多少秒未完成时发起对冲刷新
+}
 
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "booking_config.json")
 
-def setup_driver(use_existing_browser=True):
+
+def setup_driver(use_existing_browser=True, port=9222, driver_path=None):
     """
     设置 Edge WebDriver
     
     Args:
         use_existing_browser: 是否使用已打开的浏览器（True）或打开新浏览器（False）
+        port: 远程调试端口
+        driver_path: msedgedriver 路径（None 时自动查找）
     """
+    # 重依赖延迟到真正需要连接浏览器时才导入
+    import browser_manager
+    from selenium import webdriver
+    from selenium.webdriver.edge.service import Service
+    from selenium.webdriver.edge.options import Options
+    
+    def _create_driver(options):
+        if driver_path:
+            return webdriver.Edge(service=Service(executable_path=driver_path), options=options)
+        try:
+            from webdriver_manager.microsoft import EdgeChromiumDriverManager
+        except ImportError:
+            return webdriver.Edge(options=options)
+        try:
+            service = Service(EdgeChromiumDriverManager().install())
+            return webdriver.Edge(service=service, options=options)
+        except:
+            return webdriver.Edge(options=options)
+    
     edge_options = Options()
     
     if use_existing_browser:
+        # 连接前先确认调试端口可用，避免等到 attach 失败才发现
+        if not browser_manager.get_browser_version(port):
+            print(f"❌ 端口 {port} 上没有可连接的浏览器")
+            print("请先运行: python browser_manager.py start")
+            raise RuntimeError(f"远程调试端口 {port} 不可用")
+        
         # 连接到已存在的 Edge 浏览器
         # 使用远程调试端口连接到已打开的浏览器
-        edge_options.add_experimental_option("debuggerAddress", "127.0.0.1:9222")
+        edge_options.add_experimental_option("debuggerAddress", f"127.0.0.1:{port}")
         print("正在连接到已打开的 Edge 浏览器...")
         
         try:
             # 不需要启动新的浏览器，直接连接
-            if WEBDRIVER_MANAGER_AVAILABLE:
-                try:
-                    service = Service(EdgeChromiumDriverManager().install())
-                    driver = webdriver.Edge(service=service, options=edge_options)
-                except:
-                    driver = webdriver.Edge(options=edge_options)
-            else:
-                driver = webdriver.Edge(options=edge_options)
-            
+            driver = _create_driver(edge_options)
             print("✅ 已连接到现有浏览器")
-            return driver
         except Exception as e:
             print(f"❌ 连接失败: {e}")
-            print("\n请先启动 Edge（远程调试模式）：")
-            print('   "/Applications/Microsoft Edge.app/Contents/MacOS/Microsoft Edge" --remote-debugging-port=9222')
-            print("或运行: ./start_edge.sh")
+            print("\n请先启动浏览器（远程调试模式）：")
+            print("   python browser_manager.py start")
             raise
+        
+        # 切换到预订标签页（CDP 标签页 ID 即 WebDriver 窗口句柄）
+        tab = browser_manager.find_booking_tab(port)
+        if tab and tab.get("id") in driver.window_handles:
+            driver.switch_to.window(tab["id"])
+        return driver
     else:
         # 打开新的浏览器窗口
         edge_options.add_argument('--disable-blink-features=AutomationControlled')
-        
-        if WEBDRIVER_MANAGER_AVAILABLE:
-            try:
-                service = Service(EdgeChromiumDriverManager().install())
-                driver = webdriver.Edge(service=service, options=edge_options)
-            except:
-                driver = webdriver.Edge(options=edge_options)
-        else:
-            driver = webdriver.Edge(options=edge_options)
-        
+        driver = _create_driver(edge_options)
         driver.maximize_window()
         return driver
 
@@ -73,6 +120,8 @@ def click_refresh_button(driver):
     点击刷新按钮重新加载当天视图
     按钮格式: <i class="..." onclick="refreshDayView()"></i>
     """
+    from selenium.webdriver.common.by import By
+
     try:
         # 使用最精确的选择器
         selectors = [
@@ -90,6 +139,7 @@ def click_refresh_button(driver):
                 
                 if button.is_displayed():
                     driver.execute_script("arguments[0].click();", button)
+                    trace("refresh_clicked", selector=selector)
                     print("🔄 已点击刷新按钮，等待页面更新...")
                     time.sleep(2)  # 等待页面刷新
                     return True
@@ -99,66 +149,87 @@ def click_refresh_button(driver):
         print("⚠️ 未找到刷新按钮")
         return False
     except Exception as e:
+        trace("refresh_error", error=repr(e))
         print(f"刷新按钮点击失败: {e}")
         return False
 
 
-def find_available_slots(driver, time_range_start=14, time_range_end=21, court_numbers=[6, 7, 8, 9, 10]):
+# 一个可用时间段；start/end 为当天的分钟数（840 = 14:00）
+Slot = namedtuple("Slot", ["elem", "time_display", "start", "court", "end"])
+
+# 一次往返取回所有可用且未选中的按钮及其 data-value，代替逐个元素 get_attribute
+AVAILABLE_SLOTS_SCRIPT = """
+var out = [];
+var buttons = document.querySelectorAll("button[data-value].available[onclick='toggleCourt(this)']");
+for (var i = 0; i < buttons.length; i++) {
+    var b = buttons[i];
+    if (b.offsetParent === null || b.classList.contains("selected")) { continue; }
+    out.push([b, b.getAttribute("data-value")]);
+}
+return out;
+"""
+
+
+def parse_slot_value(data_value):
+    """
+    解析 data-value: "开始时间|结束时间|球场号"（时间为 3 位或 4 位 HHMM）
+    
+    Returns:
+        (开始分钟, 结束分钟, 球场号)，格式不对时返回None
+    """
+    return decode_slot_value(data_value)
+
+
+def slot_matches(data_value, court_numbers, time_range_start, time_range_end):
+    """data-value 是否符合场地号和时间范围（时间段需完全落在范围内）"""
+    parsed = parse_slot_value(data_value)
+    if not parsed:
+        return False
+    start, end, court_num = parsed
+    return court_num in court_numbers and to_minutes(time_range_start) <= start and end <= to_minutes(time_range_end)
+
+
+def find_available_slots(driver, time_range_start=14, time_range_end=21, court_numbers=[6, 7, 8, 9, 10], settle=2):
     """
     查找所有可用的时间段和球场组合（2:00pm - 9:00pm，球场6-10）
     按钮格式: <button data-value="800|900|10" class="available" onclick="toggleCourt(this)">10</button>
     data-value格式: 开始时间|结束时间|球场号 (时间为24小时制，如800表示8:00am)
+    
+    Args:
+        time_range_start: 范围开始，整数为整点（14），也可写 "17:30"
+        time_range_end: 范围结束，时间段的结束时间不能晚于它
+        settle: 扫描前等待页面稳定的秒数（已确认刷新完成时可传 0）
+    
+    Returns:
+        [Slot, ...]，按开始时间和球场排序
     """
-    print(f"正在查找可用时间段（2:00pm - 9:00pm，球场{court_numbers}）...")
-    time.sleep(2)
+    window_start, window_end = to_minutes(time_range_start), to_minutes(time_range_end)
+    print(f"正在查找可用时间段（{format_minutes(window_start)} - {format_minutes(window_end)}，球场{court_numbers}）...")
+    if settle:
+        time.sleep(settle)
     available_slots = []
     
     try:
-        # 查找所有带data-value和available class的按钮
-        buttons = driver.find_elements(By.CSS_SELECTOR, "button[data-value].available[onclick='toggleCourt(this)']")
-        
-        for btn in buttons:
-            try:
-                if not btn.is_displayed():
-                    continue
-                
-                classes = btn.get_attribute("class") or ""
-                # 排除已选中的按钮
-                if "selected" in classes:
-                    continue
-                
-                # 解析data-value: "开始时间|结束时间|球场号"
-                data_value = btn.get_attribute("data-value")
-                if not data_value:
-                    continue
-                    
-                parts = data_value.split("|")
-                if len(parts) != 3:
-                    continue
-                
-                start_time, end_time, court = parts
-                court_num = int(court)
-                
-                # 过滤球场号
-                if court_num not in court_numbers:
-                    continue
-                
-                # 解析开始时间（例如：1400 -> 14点）
-                start_hour = int(start_time[:2]) if len(start_time) >= 2 else int(start_time[0])
-                
-                # 检查时间范围
-                if time_range_start <= start_hour < time_range_end:
-                    # 格式化时间显示
-                    time_display = f"{start_time}-{end_time} 球场{court}"
-                    available_slots.append((btn, time_display, start_hour, court_num))
-            except:
+        # 一次取回所有按钮和 data-value，在本地批量解析
+        for btn, data_value in driver.execute_script(AVAILABLE_SLOTS_SCRIPT):
+            parsed = parse_slot_value(data_value)
+            if not parsed:
                 continue
+            
+            start, end, court_num = parsed
+            
+            # 过滤球场号和时间范围
+            if court_num in court_numbers and window_start <= start and end <= window_end:
+                time_display = f"{format_minutes(start)}-{format_minutes(end)} 球场{court_num}"
+                available_slots.append(Slot(btn, time_display, start, court_num, end))
                 
     except Exception as e:
+        trace("scan_error", error=repr(e))
         print(f"查找失败: {e}")
     
     # 按时间和球场排序
-    available_slots.sort(key=lambda x: (x[2], x[3]))
+    available_slots.sort(key=lambda x: (x.start, x.court))
+    trace("scan", available=len(available_slots))
     
     print(f"找到 {len(available_slots)} 个可用时间段和球场组合")
     if not available_slots:
@@ -169,10 +240,10 @@ def find_available_slots(driver, time_range_start=14, time_range_end=21, court_n
 
 def find_consecutive_slots(available_slots, num_consecutive=2, preferred_court=None):
     """
-    查找连续的时间段（同一球场）
+    查找连续的时间段（同一球场，前一个的结束时间等于下一个的开始时间）
     
     Args:
-        available_slots: 可用时间段列表 [(element, time_display, hour, court_num), ...]
+        available_slots: 可用时间段列表 [Slot, ...]
         num_consecutive: 需要的连续时间段数量
         preferred_court: 优先选择的球场号
     
@@ -182,7 +253,7 @@ def find_consecutive_slots(available_slots, num_consecutive=2, preferred_court=N
     # 按球场分组
     by_court = {}
     for slot in available_slots:
-        elem, time_display, hour, court_num = slot
+        court_num = slot.court
         if court_num not in by_court:
             by_court[court_num] = []
         by_court[court_num].append(slot)
@@ -193,13 +264,13 @@ def find_consecutive_slots(available_slots, num_consecutive=2, preferred_court=N
     # 在每个球场中查找连续时间段
     for court_num in courts_to_check:
         slots = by_court.get(court_num, [])
-        slots.sort(key=lambda x: x[2])  # 按小时排序
+        slots.sort(key=lambda x: x.start)  # 按开始时间排序
         
         # 查找连续的时间段
         for i in range(len(slots) - num_consecutive + 1):
             consecutive = [slots[i]]
             for j in range(i + 1, len(slots)):
-                if slots[j][2] == consecutive[-1][2] + 1:
+                if slots[j].start == consecutive[-1].end:
                     consecutive.append(slots[j])
                     if len(consecutive) == num_consecutive:
                         return consecutive
@@ -209,53 +280,47 @@ def find_consecutive_slots(available_slots, num_consecutive=2, preferred_court=N
     return None
 
 
-def select_slots(driver, num_slots, court_numbers=[6, 7, 8, 9, 10]):
+def plan_slots(available_slots, num_slots):
     """
-    选择指定数量的时间段，优先选择连续的时间段（同一球场）
-    每个按钮同时包含时间段和球场信息，点击即选中
+    从可用时间段中规划要选择的时间段，优先选择连续的时间段（同一球场）
     
     Returns:
-        (成功, 实际选择的数量, 选择详情列表)
-        选择详情格式: [(时间显示, 球场号), ...]
+        (候选时间段列表, 实际需要选择的数量)；没有可用时间段时返回 ([], 0)
     """
-    available_slots = find_available_slots(driver, time_range_start=14, time_range_end=21, court_numbers=court_numbers)
-    
     if len(available_slots) == 0:
-        print(f"错误: 没有可用时间段")
-        return False, 0, []
-    
-    # 优先查找连续时间段
-    target_slots = []
-    actual_num_slots = num_slots
+        return [], 0
     
     if num_slots >= 2:
         consecutive_slots = find_consecutive_slots(available_slots, num_slots)
         
         if consecutive_slots:
-            court_num = consecutive_slots[0][3]
+            court_num = consecutive_slots[0].court
             print(f"✅ 找到 {num_slots} 个连续时间段（球场{court_num}）")
-            target_slots = consecutive_slots
-        else:
-            print(f"⚠️ 未找到 {num_slots} 个连续时间段，降级为选择 1 个时间段")
-            actual_num_slots = 1
-            target_slots = available_slots[:1]
-    else:
-        target_slots = available_slots
+            return consecutive_slots, num_slots
         
-    if len(target_slots) < actual_num_slots:
-        print(f"错误: 可用时间段 ({len(target_slots)}) 少于所需数量 ({actual_num_slots})")
-        return False, 0, []
+        print(f"⚠️ 未找到 {num_slots} 个连续时间段，降级为选择 1 个时间段")
+        return available_slots[:1], 1
     
+    return available_slots, num_slots
+
+
+def click_slots(driver, target_slots, num_slots):
+    """
+    依次点击候选时间段，直到选中 num_slots 个
+    
+    Returns:
+        (选中的数量, 选择详情列表 [(时间显示, 球场号), ...])
+    """
     selected_count = 0
     booking_details = []  # 记录预订详情
     
     # 选择时间段（点击按钮即可，无需额外点击球场号）
-    for elem, time_display, hour, court_num in target_slots:
-        if selected_count >= actual_num_slots:
+    for elem, time_display, start, court_num, end in target_slots:
+        if selected_count >= num_slots:
             break
         
         try:
-            print(f"\n选择时间段 {selected_count + 1}/{actual_num_slots}: {time_display}")
+            print(f"\n选择时间段 {selected_count + 1}/{num_slots}: {time_display}")
             
             # 点击按钮（toggleCourt函数会处理选中状态）
             driver.execute_script("arguments[0].click();", elem)
@@ -263,12 +328,40 @@ def select_slots(driver, num_slots, court_numbers=[6, 7, 8, 9, 10]):
             
             selected_count += 1
             booking_details.append((time_display, court_num))
+            trace("slot_selected", slot=time_display)
             print(f"✅ 已成功选择")
             
         except Exception as e:
+            trace("select_error", slot=time_display, error=repr(e))
             print(f"选择失败: {e}")
             continue
     
+    return selected_count, booking_details
+
+
+def select_slots(driver, num_slots, court_numbers=[6, 7, 8, 9, 10], time_range_start=14, time_range_end=21, settle=2):
+    """
+    选择指定数量的时间段，优先选择连续的时间段（同一球场）
+    每个按钮同时包含时间段和球场信息，点击即选中
+    
+    Returns:
+        (成功, 实际选择的数量, 选择详情列表)
+        选择详情格式: [(时间显示, 球场号), ...]
+    """
+    available_slots = find_available_slots(driver, time_range_start=time_range_start, time_range_end=time_range_end, court_numbers=court_numbers, settle=settle)
+    
+    if len(available_slots) == 0:
+        print(f"错误: 没有可用时间段")
+        return False, 0, []
+    
+    target_slots, actual_num_slots = plan_slots(available_slots, num_slots)
+        
+    if len(target_slots) < actual_num_slots:
+        print(f"错误: 可用时间段 ({len(target_slots)}) 少于所需数量 ({actual_num_slots})")
+        return False, 0, []
+    
+    selected_count, booking_details = click_slots(driver, target_slots, actual_num_slots)
+    
     if selected_count >= actual_num_slots:
         print(f"\n✅ 成功选择了 {selected_count} 个时间段")
         return True, selected_count, booking_details
@@ -281,6 +374,8 @@ def click_book_button(driver):
     """
     点击预订按钮 (实际是 <a> 链接，带有 onclick="book()")
     """
+    from selenium.webdriver.common.by import By
+
     print("\n正在查找Book按钮...")
     
     # 优先使用最精确的选择器
@@ -319,8 +414,10 @@ def click_book_button(driver):
                             driver.execute_script("arguments[0].click();", elem)
                             time.sleep(0.5)
                             print("✅ 已点击Book按钮")
+                            trace("book_clicked", selector=selector)
                             return True
                         except Exception as e:
+                            trace("book_click_error", selector=selector, error=repr(e))
                             print(f"点击失败，尝试下一个: {e}")
                             continue
         except:
@@ -334,7 +431,10 @@ def handle_confirmation_dialog(driver, click_confirm=True):
     """
     处理确认/取消弹出窗口
     确认按钮: <a href="#" data-value="" onclick="bookSubmit()">yes</a>
+    取消按钮: 同一弹出窗口中文本为 no 的 <a>
     """
+    from selenium.webdriver.common.by import By
+
     time.sleep(0.5)
     
     if click_confirm:
@@ -347,34 +447,61 @@ def handle_confirmation_dialog(driver, click_confirm=True):
         ]
         target_selectors = confirm_selectors
     else:
-        # 取消按钮（通常是'no'）
+        # 取消按钮（'no'）：文本必须完全匹配，避免误点包含 "no" 的其他链接
         cancel_selectors = [
-            "//a[contains(text(), 'no')]",
-            "//a[contains(text(), 'No')]",
-            "//a[contains(text(), 'cancel')]",
+            "//a[@onclick='bookSubmit()']/../a[translate(normalize-space(.), 'NO', 'no')='no']",
+            "//a[contains(@onclick, 'bookSubmit')]/ancestor::*[.//a[translate(normalize-space(.), 'NO', 'no')='no']][1]//a[translate(normalize-space(.), 'NO', 'no')='no']",
+            "//a[translate(normalize-space(.), 'NO', 'no')='no']",
+            "//a[translate(normalize-space(.), 'CANEL', 'canel')='cancel']",
         ]
         target_selectors = cancel_selectors
     
     for selector in target_selectors:
         try:
             if selector.startswith("//"):
-                button = driver.find_element(By.XPATH, selector)
+                buttons = driver.find_elements(By.XPATH, selector)
             else:
-                button = driver.find_element(By.CSS_SELECTOR, selector)
+                buttons = driver.find_elements(By.CSS_SELECTOR, selector)
             
-            if button.is_displayed() and button.is_enabled():
-                driver.execute_script("arguments[0].click();", button)
-                time.sleep(0.5)
-                if click_confirm:
-                    print("✅ 已确认预订")
-                return True
+            for button in buttons:
+                if button.is_displayed() and button.is_enabled():
+                    driver.execute_script("arguments[0].click();", button)
+                    trace("dialog_clicked", confirm=click_confirm, selector=selector)
+                    time.sleep(0.5)
+                    if click_confirm:
+                        print("✅ 已确认预订")
+                    else:
+                        print("↩️ 已取消预订")
+                    return True
         except:
             continue
     
     return False
 
 
-def wait_until_target_time(target_hour=8, target_minute=15, target_second=1):
+def deselect_slots(driver):
+    """
+    取消所有已选中的时间段（再次调用 toggleCourt）
+    
+    Returns:
+        取消选择的数量
+    """
+    return driver.execute_script("""
+        var buttons = document.querySelectorAll("button[data-value].selected[onclick='toggleCourt(this)']");
+        for (var i = 0; i < buttons.length; i++) { toggleCourt(buttons[i]); }
+        return buttons.length;
+    """)
+
+
+def seconds_until(target_hour, target_minute, target_second, now=None):
+    """距离下一次到达指定时间的秒数（已过今天的目标时间则算到明天）"""
+    now = now or datetime.now()
+    target = now.replace(hour=target_hour, minute=target_minute, second=target_second, microsecond=0)
+    remaining = (target - now).total_seconds()
+    return remaining if remaining >= 0 else remaining + 86400
+
+
+def wait_until_target_time(target_hour=8, target_minute=15, target_second=1, on_tick=None):
     """
     等待直到指定时间后的几秒
     
@@ -382,32 +509,66 @@ def wait_until_target_time(target_hour=8, target_minute=15, target_second=1):
         target_hour: 目标小时（24小时制）
         target_minute: 目标分钟
         target_second: 目标时间后的秒数
+        on_tick: 每次循环调用的回调 on_tick(剩余秒数)，用于预检和预热
     """
     print(f"\n⏰ 定时模式：等待到 {target_hour:02d}:{target_minute:02d}:{target_second:02d} 自动运行")
     
+    # 开始时就在目标分钟内（已过目标秒）则立即运行；否则固定截止时刻，
+    # 回调耗时再长也只会晚于截止时刻退出，不会错过后等到明天
+    start = datetime.now()
+    if start.hour == target_hour and start.minute == target_minute and start.second >= target_second:
+        deadline = start
+    else:
+        deadline = start + timedelta(seconds=seconds_until(target_hour, target_minute, target_second, start))
+    
     while True:
         now = datetime.now()
         current_time_str = now.strftime("%H:%M:%S")
         
         # 检查是否到达目标时间
-        if now.hour == target_hour and now.minute == target_minute and now.second >= target_second:
+        remaining = (deadline - now).total_seconds()
+        if remaining <= 0:
             print(f"\n🎯 已到达目标时间 {current_time_str}，开始预订流程！")
             break
         
-        # 每秒更新一次显示
+        if on_tick:
+            on_tick(remaining)
+        
+        # 每秒更新一次显示；最后一秒按剩余时间精确休眠，避免最多 1 秒的延迟
         print(f"\r⏳ 当前时间: {current_time_str} | 目标时间: {target_hour:02d}:{target_minute:02d}:{target_second:02d}", end="", flush=True)
-        time.sleep(1)
+        time.sleep(min(1, max((deadline - datetime.now()).total_seconds(), 0)))
     
     print()  # 换行
 
 
-def run_booking_flow(driver, NUM_SLOTS, MAX_RETRIES, RETRY_INTERVAL, CLICK_CONFIRM):
+def run_booking_flow(driver, NUM_SLOTS, MAX_RETRIES, RETRY_INTERVAL, CLICK_CONFIRM,
+                     court_numbers=[6, 7, 8, 9, 10], hour_range=(14, 21), diagnostics=None, refresher=None,
+                     scan_settle=2):
     """
     执行预订流程
+    
+    Args:
+        scan_settle: 点击刷新按钮后、扫描时间表前再等待的秒数
+        diagnostics: DiagnosticsRecorder，失败时采集现场（可选）
+        refresher: HedgedRefresher，对冲刷新并切换到先完成的标签页（可选）
+    
+    Returns:
+        成功预订的时间段列表 [(时间显示, 球场号), ...]，失败时为空列表
     """
+    def refresh():
+        if refresher:
+            # 对冲刷新确认完成后，扫描前无需再固定等待；两个标签页都超时时
+            # 不再发起第三次刷新，只在当前标签页短暂等待后直接扫描
+            return 0 if refresher.refresh() else 0.3
+        click_refresh_button(driver)
+        return scan_settle
+    
+    if diagnostics:
+        diagnostics.install(driver)
+    
     # 先点击刷新按钮，确保页面是最新的
     print("\n🔄 刷新页面以获取最新时间段...")
-    click_refresh_button(driver)
+    settle = refresh()
     
     # 记录所有成功预订的时间段
     all_bookings = []
@@ -417,22 +578,31 @@ def run_booking_flow(driver, NUM_SLOTS, MAX_RETRIES, RETRY_INTERVAL, CLICK_CONFI
         print(f"\n{'='*60}")
         print(f"尝试 {attempt}/{MAX_RETRIES}")
         print(f"{'='*60}\n")
+        if diagnostics:
+            diagnostics.next_attempt(attempt)
         
         # 选择时间段
-        slots_selected, actual_selected, booking_details = select_slots(driver, NUM_SLOTS)
+        slots_selected, actual_selected, booking_details = select_slots(
+            driver, NUM_SLOTS, court_numbers=court_numbers,
+            time_range_start=hour_range[0], time_range_end=hour_range[1], settle=settle)
         
         if not slots_selected:
             print(f"\n⚠️ 尝试 {attempt}: 未能选择足够的时间段")
+            if diagnostics:
+                diagnostics.capture(driver, "select_failed", f"只选择了 {actual_selected}/{NUM_SLOTS} 个时间段",
+                                    final=attempt == MAX_RETRIES)
             
             # 点击刷新按钮重新加载
             if attempt < MAX_RETRIES:
-                click_refresh_button(driver)
+                settle = refresh()
                 print(f"等待 {RETRY_INTERVAL} 秒后重试...")
                 time.sleep(RETRY_INTERVAL)
                 continue
             else:
                 print(f"\n❌ 已尝试 {MAX_RETRIES} 次，均未成功")
-                return
+                if diagnostics:
+                    diagnostics.flush()
+                return []
         
         # 点击Book按钮
         print(f"\n✅ 已选择 {actual_selected} 个时间段，现在点击Book按钮")
@@ -440,16 +610,25 @@ def run_booking_flow(driver, NUM_SLOTS, MAX_RETRIES, RETRY_INTERVAL, CLICK_CONFI
         
         if not book_clicked:
             print(f"\n⚠️ 尝试 {attempt}: 未找到Book按钮")
+            if diagnostics:
+                diagnostics.capture(driver, "book_button_missing", "未找到Book按钮", final=attempt == MAX_RETRIES)
             if attempt < MAX_RETRIES:
                 print(f"等待 {RETRY_INTERVAL} 秒后重试...")
                 time.sleep(RETRY_INTERVAL)
                 continue
             else:
                 print(f"\n❌ 已尝试 {MAX_RETRIES} 次，均未找到Book按钮")
-                return
+                if diagnostics:
+                    diagnostics.flush()
+                return []
         
         # 处理确认弹出窗口
         confirmation_handled = handle_confirmation_dialog(driver, click_confirm=CLICK_CONFIRM)
+        if not confirmation_handled and diagnostics:
+            diagnostics.capture(driver, "dialog_missing", "未找到确认框按钮")
+        
+        if diagnostics:
+            diagnostics.flush()
         
         # 记录本次预订的详情
         all_bookings.extend(booking_details)
@@ -478,23 +657,177 @@ def run_booking_flow(driver, NUM_SLOTS, MAX_RETRIES, RETRY_INTERVAL, CLICK_CONFI
                     print(f"  {i}. {time_str}")
                 print()
         
-        return
+        return all_bookings
 
 
-def main():
-    """主函数"""
-    # ========== 配置参数 ==========
-    NUM_SLOTS = 2  # 要预订的时间段数量
-    USE_EXISTING_BROWSER = True  # 使用已打开的浏览器
-    MAX_RETRIES = 5  # 最大重试次数
-    RETRY_INTERVAL = 1  # 重试间隔（秒）
-    CLICK_CONFIRM = True  # 在弹出窗口中点击确认
+def parse_int_range(value):
+    """解析 "6-10"、"6,7,9" 或 "6-8,10" 为整数列表"""
+    numbers = []
+    for part in str(value).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = (int(x) for x in part.split("-", 1))
+            numbers.extend(range(start, end + 1))
+        else:
+            numbers.append(int(part))
+    return numbers
+
+
+def parse_hour_range(value):
+    """解析 "14-21" 为 [14, 21]，"17:30-20:00" 为 ["17:30", "20:00"]"""
+    return [int(x) if ":" not in x else x.strip() for x in str(value).split("-", 1)]
+
+
+def load_config(path=None):
+    """
+    读取 JSON 配置文件并与默认配置合并
     
-    print("="*60)
-    print("网球场快速预订脚本")
-    print("="*60)
+    Args:
+        path: 配置文件路径；None 时使用脚本目录下的 booking_config.json（不存在则忽略）
+    """
+    config = dict(DEFAULT_CONFIG)
+    config_path = path or DEFAULT_CONFIG_PATH
+    if path or os.path.exists(config_path):
+        with open(config_path, encoding="utf-8") as f:
+            user_config = json.load(f)
+        unknown = set(user_config) - set(DEFAULT_CONFIG)
+        if unknown:
+            raise ValueError(f"配置文件中有未知的配置项: {', '.join(sorted(unknown))}")
+        config.update(user_config)
+    return config
+
+
+# 配置项的类型（bool 也是 int 的子类，数值项单独排除 bool）
+CONFIG_TYPES = {
+    "click_confirm": bool, "use_existing_browser": bool, "preflight": bool, "diagnostics": bool,
+    "diagnostics_screenshot": bool, "hedge_refresh": bool,
+    "courts": list, "hour_range": list, "num_slots": int, "max_retries": int, "retry_interval": (int, float),
+    "scan_settle": (int, float), "port": int, "rehearsal_lead": (int, float), "watch_dates": list, "watch_interval": (int, float),
+    "quiet_hours": list, "watch_max_bookings": int, "rules": list, "hedge_delay": (int, float),
+}
+
+
+def check_config_types(config):
+    """检查配置项的类型，出错时抛出 ValueError"""
+    for key, expected in CONFIG_TYPES.items():
+        value = config[key]
+        if isinstance(value, tuple) and expected is list:
+            continue
+        if (isinstance(value, bool) and expected is not bool) or not isinstance(value, expected):
+            names = "/".join(t.__name__ for t in (expected if isinstance(expected, tuple) else (expected,)))
+            raise ValueError(f"{key} 的类型应为 {names}: {value!r}")
+    if len(config["hour_range"]) != 2:
+        raise ValueError(f"hour_range 应为 [开始, 结束]: {config['hour_range']}")
+
+
+def validate_config(config):
+    """校验配置，出错时抛出 ValueError"""
+    check_config_types(config)
+    if config["mode"] not in (None, "now", "scheduled", "rehearse", "watch", "rules"):
+        raise ValueError(f"mode 必须是 now、scheduled、rehearse、watch 或 rules: {config['mode']}")
+    parse_time_of_day(config["target_time"])
+    
+    courts = config["courts"]
+    if not courts or not all(isinstance(c, int) and c > 0 for c in courts):
+        raise ValueError(f"courts 必须是正整数列表: {courts}")
+    
+    start, end = (to_minutes(v) for v in config["hour_range"])
+    if not (0 <= start < end <= 24 * 60):
+        raise ValueError(f"hour_range 无效: {config['hour_range']}")
+    
+    if config["num_slots"] < 1:
+        raise ValueError("num_slots 至少为 1")
+    if config["max_retries"] < 1:
+        raise ValueError("max_retries 至少为 1")
+    if config["retry_interval"] < 0:
+        raise ValueError("retry_interval 不能为负数")
+    if config["scan_settle"] < 0:
+        raise ValueError("scan_settle 不能为负数")
+    if config["driver_path"] and not os.path.exists(config["driver_path"]):
+        raise ValueError(f"driver_path 不存在: {config['driver_path']}")
+    if config["booking_date"]:
+        datetime.strptime(config["booking_date"], "%Y-%m-%d")
+    if config["rehearsal_lead"] < 0:
+        raise ValueError("rehearsal_lead 不能为负数")
+    for date in config["watch_dates"]:
+        datetime.strptime(date, "%Y-%m-%d")
+    if config["watch_interval"] <= 0:
+        raise ValueError("watch_interval 必须大于 0")
+    from watcher import parse_quiet_hours
+    parse_quiet_hours(config["quiet_hours"])
+    
+    if config["hedge_delay"] < 0:
+        raise ValueError("hedge_delay 不能为负数")
+    if config["hedge_refresh"] and not config["booking_date"]:
+        # 没有日期就无法确认备用标签页与主标签页是同一天，获胜后可能订到错误的日期
+        raise ValueError("hedge_refresh 需要同时指定 booking_date（--date）")
+    
+    if config["rules"]:
+        from rules import parse_rule
+        names = [parse_rule(raw, config)["name"] for raw in config["rules"]]
+        if len(names) != len(set(names)):
+            raise ValueError("规则名称不能重复")
+    elif config["mode"] == "rules":
+        raise ValueError("rules 模式需要在配置文件中定义 rules")
+    return config
+
+
+def build_arg_parser():
+    """构造命令行参数解析器"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="网球场快速预订脚本")
+    parser.add_argument("-c", "--config", help="JSON 配置文件（默认: 脚本目录下的 booking_config.json）")
+    parser.add_argument("--mode", choices=["now", "scheduled", "rehearse", "watch", "rules"],
+                        help="now: 立即预订；scheduled: 等到目标时间再预订；rehearse: 只彩排一次，不提交；"
+                             "watch: 长时间监控退订的时间段；rules: 按配置文件中的循环规则预订")
+    parser.add_argument("--at", dest="target_time", help="定时模式的目标时间 HH:MM[:SS]（默认 08:15:01）")
+    parser.add_argument("--courts", type=parse_int_range, help="场地号码，如 6-10 或 6,7,9")
+    parser.add_argument("--hours", dest="hour_range", type=parse_hour_range,
+                        help="时间范围 开始-结束，如 14-21 或 17:30-20:00")
+    parser.add_argument("--slots", dest="num_slots", type=int, help="要预订的时间段数量")
+    parser.add_argument("--retries", dest="max_retries", type=int, help="最大重试次数")
+    parser.add_argument("--retry-interval", type=float, help="重试间隔（秒）")
+    parser.add_argument("--no-confirm", dest="click_confirm", action="store_false", default=None,
+                        help="不点击最终确认按钮")
+    parser.add_argument("--date", dest="booking_date", help="预检时期望页面上选中的日期 YYYY-MM-DD")
+    parser.add_argument("--no-preflight", dest="preflight", action="store_false", default=None,
+                        help="定时模式等待期间不做预检和预热")
+    parser.add_argument("--rehearsal-lead", type=float, help="定时模式在目标时间前多少秒彩排（会真实点击 Book 再取消；默认 0 不彩排）")
+    parser.add_argument("--no-diagnostics", dest="diagnostics", action="store_false", default=None,
+                        help="失败时不保存诊断文件")
+    parser.add_argument("--watch-dates", type=lambda v: [d.strip() for d in v.split(",") if d.strip()],
+                        help="监控模式要监控的日期，如 2026-10-20,2026-10-21")
+    parser.add_argument("--watch-interval", type=float, help="监控模式检查间隔（秒）")
+    parser.add_argument("--quiet-hours", type=lambda v: [p.strip() for p in v.split(",") if p.strip()],
+                        help="监控模式的静默时段，如 23:00-06:30,12:00-13:00")
+    parser.add_argument("--scan-settle", type=float, help="刷新后扫描时间表前再等待的秒数（可用 simulate.py 选择）")
+    parser.add_argument("--hedge-refresh", action="store_true", default=None,
+                        help="在同一日期的第二个预订标签页上对冲刷新")
+    parser.add_argument("--hedge-delay", type=float, help="主标签页刷新多少秒未完成时发起对冲刷新")
+    parser.add_argument("--port", type=int, help="远程调试端口")
+    parser.add_argument("--driver-path", help="msedgedriver 路径")
+    parser.add_argument("--print-config", action="store_true", help="打印合并后的配置并退出（不连接浏览器）")
+    return parser
+
+
+def resolve_config(argv=None):
+    """解析命令行参数、读取配置文件并校验，返回 (配置, 命令行参数)"""
+    args = build_arg_parser().parse_args(argv)
+    config = load_config(args.config)
+    
+    for key in DEFAULT_CONFIG:
+        value = getattr(args, key, None)
+        if value is not None:
+            config[key] = value
     
-    # 显示选项菜单
+    return validate_config(config), args
+
+
+def ask_mode():
+    """交互式询问运行模式（仅在未指定 mode 且在终端中运行时使用）"""
     print("\n请选择运行模式：")
     print("1. 立即开始预订")
     print("2. 定时预订（8:15:01 AM 自动运行）")
@@ -503,42 +836,158 @@ def main():
     while True:
         choice = input("请输入选项 (1 或 2): ").strip()
         if choice in ['1', '2']:
-            break
+            return "scheduled" if choice == '2' else "now"
         print("❌ 无效选项，请输入 1 或 2")
+
+
+def build_wait_callback(driver, config):
+    """
+    组合定时模式等待期间的回调（预检、彩排）
+    
+    Returns:
+        on_tick(剩余秒数) 回调，没有需要运行的内容时返回None
+    """
+    callbacks = []
+    
+    if config["preflight"]:
+        from preflight import Preflight
+        expected_date = None
+        if config["booking_date"]:
+            expected_date = datetime.strptime(config["booking_date"], "%Y-%m-%d").date()
+        callbacks.append(Preflight(driver, expected_date=expected_date))
     
-    scheduled_mode = (choice == '2')
+    if config["rehearsal_lead"]:
+        from rehearsal import Rehearsal
+        callbacks.append(Rehearsal(driver, lead=config["rehearsal_lead"], num_slots=config["num_slots"],
+                                   court_numbers=config["courts"], hour_range=config["hour_range"]))
     
-    if USE_EXISTING_BROWSER:
+    if not callbacks:
+        return None
+    
+    def on_tick(remaining):
+        for callback in callbacks:
+            callback(remaining)
+    
+    return on_tick
+
+
+def main(argv=None):
+    """主函数"""
+    try:
+        config, args = resolve_config(argv)
+    except (ValueError, TypeError, OSError) as e:
+        print(f"❌ 配置错误: {e}")
+        return 2
+    
+    if args.print_config:
+        print(json.dumps(config, ensure_ascii=False, indent=2))
+        return 0
+    
+    print("="*60)
+    print("网球场快速预订脚本")
+    print("="*60)
+    
+    mode = config["mode"]
+    if mode is None:
+        # cron / systemd 下没有终端，默认立即运行
+        mode = ask_mode() if sys.stdin.isatty() else "now"
+    scheduled_mode = (mode == "scheduled")
+    
+    if config["use_existing_browser"]:
         print("\n请确保：")
         print("1. 已使用远程调试模式启动 Edge 浏览器")
         print("2. 已在浏览器中手动登录到预订网站")
         print("3. 当前页面是预订页面")
         print("4. 已选择好要预订的日期")
     
-    if not scheduled_mode:
-        print(f"\n将尝试 {MAX_RETRIES} 次，每次间隔 {RETRY_INTERVAL} 秒")
+    if mode == "now":
+        print(f"\n将尝试 {config['max_retries']} 次，每次间隔 {config['retry_interval']} 秒")
     print("="*60)
     
+    recorder = None
+    if config["diagnostics"]:
+        from diagnostics import DiagnosticsRecorder
+        recorder = DiagnosticsRecorder(config["diagnostics_dir"], screenshot=config["diagnostics_screenshot"])
+    
     driver = None
     try:
-        driver = setup_driver(use_existing_browser=USE_EXISTING_BROWSER)
+        driver = setup_driver(use_existing_browser=config["use_existing_browser"],
+                              port=config["port"], driver_path=config["driver_path"])
         
         print(f"\n当前页面: {driver.current_url}")
         print(f"页面标题: {driver.title}\n")
         
+        # 彩排模式：走一遍预订路径但不提交
+        if mode == "rehearse":
+            from rehearsal import run_rehearsal
+            result = run_rehearsal(driver, num_slots=config["num_slots"], court_numbers=config["courts"],
+                                   hour_range=config["hour_range"])
+            return 0 if result["ok"] else 1
+        
+        # 监控模式：长时间运行，出现退订时立即预订
+        if mode == "watch":
+            from watcher import CancellationWatcher, discover_date_tabs
+            dates = [datetime.strptime(d, "%Y-%m-%d").date() for d in config["watch_dates"]]
+            tabs = discover_date_tabs(driver, dates)
+            if not tabs:
+                print("❌ 没有可监控的预订标签页")
+                return 1
+            CancellationWatcher(driver, tabs, config, interval=config["watch_interval"],
+                                quiet_hours=config["quiet_hours"], max_bookings=config["watch_max_bookings"],
+                                diagnostics=recorder).run()
+            return 0
+        
+        # 循环规则模式：按规则的开放时刻批量预订
+        if mode == "rules":
+            from rules import BrowserBatchRunner, RuleScheduler, parse_rule, DEFAULT_STATE_PATH
+            runner = BrowserBatchRunner(driver, config)
+            RuleScheduler([parse_rule(raw, config) for raw in config["rules"]], runner.fire,
+                          prepare=runner.prepare, state_path=config["rules_state"] or DEFAULT_STATE_PATH).run()
+            return 0
+        
+        # 对冲刷新：开始等待前先找好备用标签页
+        refresher = None
+        if config["hedge_refresh"]:
+            from hedge import HedgedRefresher, find_hedge_tab
+            expected_date = datetime.strptime(config["booking_date"], "%Y-%m-%d").date()
+            primary = driver.current_window_handle
+            hedge_tab = find_hedge_tab(driver, primary, expected_date)
+            if hedge_tab:
+                refresher = HedgedRefresher(driver, primary, hedge_tab, hedge_delay=config["hedge_delay"])
+                print("✅ 已找到备用预订标签页，启用对冲刷新")
+            else:
+                print("⚠️ 未找到同一日期的第二个预订标签页，不启用对冲刷新")
+        
         # 如果是定时模式，等待到指定时间
         if scheduled_mode:
-            wait_until_target_time(target_hour=8, target_minute=15, target_second=1)
+            target_hour, target_minute, target_second = parse_time_of_day(config["target_time"])
+            wait_until_target_time(target_hour=target_hour, target_minute=target_minute,
+                                   target_second=target_second, on_tick=build_wait_callback(driver, config))
         
         # 执行预订流程
-        run_booking_flow(driver, NUM_SLOTS, MAX_RETRIES, RETRY_INTERVAL, CLICK_CONFIRM)
+        booked = run_booking_flow(driver, config["num_slots"], config["max_retries"], config["retry_interval"],
+                                  config["click_confirm"], court_numbers=config["courts"],
+                                  hour_range=config["hour_range"], diagnostics=recorder, refresher=refresher,
+                                  scan_settle=config["scan_settle"])
+        if refresher:
+            refresher.report()
+        if not booked:
+            # 由 cron/systemd 启动时，用退出码表示没有订到
+            return 1
         
     except KeyboardInterrupt:
         print("\n\n用户取消")
+        return 130
     except Exception as e:
         print(f"\n❌ 错误: {e}")
+        if recorder and driver:
+            recorder.capture(driver, "exception", repr(e))
+        return 1
+    finally:
+        if recorder:
+            recorder.close()
+    return 0
 
 
 if __name__ == "__main__":
-    main()
-
+    sys.exit(main())
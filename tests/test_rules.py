@@ -0,0 +1,78 @@
+from datetime import date, datetime
+
+import pytest
+
+import tennis_booking as tb
+from rules import RuleScheduler, missed_occurrences, next_occurrence, parse_rule
+
+
+@pytest.fixture
+def rule():
+    # 每周二，提前 7 天，08:15:01 开放
+    return parse_rule({"name": "tue", "weekdays": ["tue"], "days_ahead": 7, "hour_range": ["17:30", 20]},
+                      dict(tb.DEFAULT_CONFIG))
+
+
+def test_parse_rule_rejects_empty_window():
+    with pytest.raises(ValueError):
+        parse_rule({"name": "bad", "hour_range": [20, 18]}, dict(tb.DEFAULT_CONFIG))
+
+
+def test_next_occurrence(rule):
+    # 2026-10-06 是周二：开放时刻为 2026-10-06 08:15:01，打球日期 2026-10-13
+    release, play_date = next_occurrence(rule, datetime(2026, 10, 6, 8, 0))
+    assert release == datetime(2026, 10, 6, 8, 15, 1)
+    assert play_date == date(2026, 10, 13)
+
+
+def test_next_occurrence_is_exclusive(rule):
+    release, play_date = next_occurrence(rule, datetime(2026, 10, 6, 8, 15, 1))
+    assert release == datetime(2026, 10, 13, 8, 15, 1)
+    assert play_date == date(2026, 10, 20)
+
+
+def test_missed_occurrences_keeps_future_play_dates(rule):
+    # 停机两周：10-06 的开放对应的打球日期 10-13 已过，只补 10-13 的开放（打球日期 10-20）
+    missed = missed_occurrences(rule, datetime(2026, 10, 1), datetime(2026, 10, 14, 9))
+    assert missed == [(datetime(2026, 10, 13, 8, 15, 1), date(2026, 10, 20))]
+
+
+def test_catch_up_after_restart_before_first_fire(rule, tmp_path):
+    state_path = str(tmp_path / "state.json")
+    fired = []
+
+    def fire(batch):
+        fired.append([(r["name"], d) for r, d in batch])
+        return {}
+
+    # 第一次运行：从 10-01 开始调度，还没有开放过就退出
+    first = RuleScheduler([rule], fire, state_path=state_path)
+    first.catch_up(datetime(2026, 10, 1, 9))
+    first.build_queue(datetime(2026, 10, 1, 9))
+    assert fired == []
+
+    # 10-07 重启：错过了 10-06 的开放，打球日期 10-13 还没过，应补跑
+    second = RuleScheduler([rule], fire, state_path=state_path)
+    second.catch_up(datetime(2026, 10, 7, 10))
+    assert fired == [[("tue", date(2026, 10, 13))]]
+    assert second.state["tue"]["last_release"] == "2026-10-06T08:15:01"
+
+    # 再次重启不会重复补跑
+    third = RuleScheduler([rule], fire, state_path=state_path)
+    third.catch_up(datetime(2026, 10, 7, 11))
+    assert len(fired) == 1
+
+
+def test_parse_rule_rejects_non_dict():
+    with pytest.raises(ValueError):
+        parse_rule("x", dict(tb.DEFAULT_CONFIG))
+
+
+def test_fire_error_is_recorded_and_scheduler_continues(rule, tmp_path):
+    def fire(batch):
+        raise RuntimeError("no such window")
+
+    scheduler = RuleScheduler([rule], fire, state_path=str(tmp_path / "state.json"))
+    scheduler._fire([(rule, date(2026, 10, 13))])
+    assert scheduler.state["tue"]["booked"] == []
+    assert scheduler.state["tue"]["last_release"] == "2026-10-06T08:15:01"
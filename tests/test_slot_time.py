@@ -0,0 +1,75 @@
+import pytest
+
+import tennis_booking as tb
+from slot_time import decode_slot_value, format_minutes, parse_hhmm, to_minutes
+
+
+def make_slots(values):
+    slots = []
+    for value in values:
+        start, end, court = decode_slot_value(value)
+        slots.append(tb.Slot(value, value, start, court, end))
+    return sorted(slots, key=lambda s: (s.start, s.court))
+
+
+def test_parse_hhmm_three_and_four_digits():
+    assert parse_hhmm("800") == 480
+    assert parse_hhmm("1730") == 1050
+    assert parse_hhmm("2400") == 1440
+
+
+@pytest.mark.parametrize("text", ["80", "12345", "8:00", "860", "2430"])
+def test_parse_hhmm_invalid(text):
+    with pytest.raises(ValueError):
+        parse_hhmm(text)
+
+
+def test_decode_morning_slot():
+    # 旧的按小时解析会把 800 当成 80 点
+    assert decode_slot_value("800|900|10") == (480, 540, 10)
+    assert tb.parse_slot_value("800|900|10") == (480, 540, 10)
+
+
+@pytest.mark.parametrize("value", ["", None, "800|900", "900|800|1", "abc|900|1", "800|900|x"])
+def test_decode_invalid(value):
+    assert decode_slot_value(value) is None
+
+
+def test_to_minutes_and_format():
+    assert to_minutes(14) == 840
+    assert to_minutes("17:30") == 1050
+    assert format_minutes(1050) == "17:30"
+    with pytest.raises(ValueError):
+        to_minutes(25)
+
+
+def test_half_past_window():
+    assert tb.slot_matches("1730|1830|7", [7], "17:30", "20:00")
+    assert tb.slot_matches("1900|2000|7", [7], "17:30", "20:00")
+    # 开始早于窗口或结束晚于窗口都不算
+    assert not tb.slot_matches("1700|1800|7", [7], "17:30", "20:00")
+    assert not tb.slot_matches("1930|2030|7", [7], "17:30", "20:00")
+    assert not tb.slot_matches("1730|1830|8", [7], "17:30", "20:00")
+
+
+def test_parse_hour_range_with_minutes():
+    assert tb.parse_hour_range("17:30-20:00") == ["17:30", "20:00"]
+    assert tb.parse_hour_range("14-21") == [14, 21]
+
+
+def test_consecutive_half_hour_slots():
+    slots = make_slots(["1730|1800|7", "1800|1830|7", "1830|1900|7", "1800|1830|8"])
+    block = tb.find_consecutive_slots(slots, 3)
+    assert [s.start for s in block] == [1050, 1080, 1110]
+    assert {s.court for s in block} == {7}
+
+
+def test_consecutive_ninety_minute_slots():
+    slots = make_slots(["1730|1900|7", "1900|2030|7"])
+    block = tb.find_consecutive_slots(slots, 2)
+    assert [(s.start, s.end) for s in block] == [(1050, 1140), (1140, 1230)]
+
+
+def test_gap_is_not_consecutive():
+    slots = make_slots(["1700|1800|7", "1830|1930|7"])
+    assert tb.find_consecutive_slots(slots, 2) is None
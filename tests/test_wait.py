@@ -0,0 +1,33 @@
+from datetime import datetime
+
+import tennis_booking as tb
+
+
+def test_seconds_until_later_today():
+    assert tb.seconds_until(8, 15, 1, datetime(2026, 10, 20, 8, 14, 0)) == 61
+
+
+def test_seconds_until_exactly_now():
+    assert tb.seconds_until(8, 15, 1, datetime(2026, 10, 20, 8, 15, 1)) == 0
+
+
+def test_seconds_until_passed_rolls_to_tomorrow():
+    # 过了目标时间 59 秒：不再返回负数（旧实现会返回 -59 并空转）
+    assert tb.seconds_until(8, 15, 1, datetime(2026, 10, 20, 8, 16, 0)) == 86400 - 59
+
+
+def test_wait_exits_after_slow_callback(monkeypatch):
+    # 回调耗时超过剩余时间（越过目标分钟）时，等待循环仍应立即退出，而不是等到明天
+    clock = {"now": datetime(2026, 10, 20, 8, 14, 58)}
+
+    class FakeDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return clock["now"]
+
+    def slow_tick(remaining):
+        clock["now"] = datetime(2026, 10, 20, 8, 16, 5)
+
+    monkeypatch.setattr(tb, "datetime", FakeDatetime)
+    monkeypatch.setattr(tb.time, "sleep", lambda seconds: None)
+    tb.wait_until_target_time(8, 15, 1, on_tick=slow_tick)
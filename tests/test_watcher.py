@@ -0,0 +1,59 @@
+from datetime import datetime
+
+import pytest
+
+from watcher import in_quiet_hours, parse_quiet_hours
+
+
+def test_parse_quiet_hours():
+    assert parse_quiet_hours(["23:00-06:30", "12:00-13:00"]) == [(1380, 390), (720, 780)]
+    assert parse_quiet_hours(None) == []
+
+
+@pytest.mark.parametrize("spec", ["23:00", "99:00-98:00", "23:60-06:00", "24:30-06:00"])
+def test_parse_quiet_hours_invalid(spec):
+    with pytest.raises(ValueError):
+        parse_quiet_hours([spec])
+
+
+@pytest.mark.parametrize("hour, minute, quiet", [
+    (23, 0, True), (23, 59, True), (0, 0, True), (6, 29, True),
+    (6, 30, False), (22, 59, False), (12, 0, False),
+])
+def test_quiet_hours_across_midnight(hour, minute, quiet):
+    periods = parse_quiet_hours(["23:00-06:30"])
+    assert in_quiet_hours(periods, datetime(2026, 10, 20, hour, minute)) is quiet
+
+
+def test_quiet_hours_same_day():
+    periods = parse_quiet_hours(["12:00-13:00"])
+    assert in_quiet_hours(periods, datetime(2026, 10, 20, 12, 30))
+    assert not in_quiet_hours(periods, datetime(2026, 10, 20, 13, 0))
+
+
+def test_slot_that_reappears_is_retried(monkeypatch):
+    import tennis_booking as tb
+    from watcher import AVAILABLE_VALUES_SCRIPT, CancellationWatcher
+
+    pages = [["1800|1900|7"], [], ["1800|1900|7"]]
+
+    class FakeDriver:
+        class switch_to:
+            @staticmethod
+            def window(handle):
+                pass
+
+        def execute_script(self, script, *args):
+            return pages[0] if script == AVAILABLE_VALUES_SCRIPT else True
+
+    monkeypatch.setattr("watcher.time.sleep", lambda seconds: None)
+    config = dict(tb.DEFAULT_CONFIG, courts=[7], hour_range=[17, 21])
+    watcher = CancellationWatcher(FakeDriver(), {"h": "2026-10-20"}, config, settle=0)
+
+    fresh = watcher.poll()["h"]
+    watcher.attempted["h"] |= fresh        # 预订失败（被别人抢走）
+    assert watcher.poll() == {}
+    pages.pop(0)
+    assert watcher.poll() == {}            # 时间段消失
+    pages.pop(0)
+    assert watcher.poll() == {"h": {"1800|1900|7"}}   # 再次出现时重新预订
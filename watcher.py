@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+退订监控
+除了 8:15 开放时的抢订，白天也会有会员取消预订。监控模式长时间运行，
+定期在每个日期的标签页里调用 refreshDayView()，只用一次 execute_script 读取可用时间段的
+data-value 列表做变化检测（不做完整扫描）；出现符合偏好的新时间段时立即预订。
+静默时段内不做任何请求
+"""
+
+import random
+import time
+from datetime import datetime
+
+# 只返回可用且未选中的 data-value 列表，一次往返完成变化检测
+AVAILABLE_VALUES_SCRIPT = """
+var out = [];
+var buttons = document.querySelectorAll("button[data-value].available[onclick='toggleCourt(this)']");
+for (var i = 0; i < buttons.length; i++) {
+    if (buttons[i].className.indexOf("selected") < 0) { out.push(buttons[i].getAttribute("data-value")); }
+}
+return out;
+"""
+
+REFRESH_SCRIPT = """
+if (typeof window.refreshDayView !== "function") { return false; }
+refreshDayView();
+return true;
+"""
+
+PAGE_TEXT_SCRIPT = "return document.body ? document.body.innerText.slice(0, 20000) : '';"
+
+
+def parse_quiet_hours(specs):
+    """
+    解析静默时段，如 ["23:00-06:30", "12:00-13:00"]（可跨午夜）
+
+    Returns:
+        [(开始分钟, 结束分钟), ...]
+    """
+    periods = []
+    for spec in specs or []:
+        try:
+            start, end = spec.split("-", 1)
+            start_h, start_m = (int(x) for x in start.strip().split(":"))
+            end_h, end_m = (int(x) for x in end.strip().split(":"))
+        except ValueError:
+            raise ValueError(f"静默时段格式应为 HH:MM-HH:MM: {spec}")
+        for hour, minute in ((start_h, start_m), (end_h, end_m)):
+            if hour < 0 or minute < 0 or minute >= 60 or hour > 24 or (hour == 24 and minute):
+                raise ValueError(f"静默时段中的时间无效: {spec}")
+        periods.append((start_h * 60 + start_m, end_h * 60 + end_m))
+    return periods
+
+
+def in_quiet_hours(periods, now=None):
+    """当前时间是否在静默时段内"""
+    now = now or datetime.now()
+    minute = now.hour * 60 + now.minute
+    for start, end in periods:
+        if start <= end:
+            if start <= minute < end:
+                return True
+        elif minute >= start or minute < end:
+            return True
+    return False
+
+
+def discover_date_tabs(driver, dates, url_prefix="https://members.swtc.ca/booking.html"):
+    """
+    在所有预订标签页中按页面上的日期找到对应的标签页
+
+    Args:
+        driver: WebDriver
+        dates: 要监控的日期列表（date 对象）；为空时监控所有预订标签页
+
+    Returns:
+        {窗口句柄: 标签名}
+    """
+    from preflight import date_patterns
+
+    original = driver.current_window_handle
+    tabs = {}
+    try:
+        for handle in driver.window_handles:
+            driver.switch_to.window(handle)
+            if not driver.current_url.startswith(url_prefix):
+                continue
+            if not dates:
+                tabs[handle] = driver.title or handle[:8]
+                continue
+            text = driver.execute_script(PAGE_TEXT_SCRIPT)
+            for date in dates:
+                if any(p in text for p in date_patterns(date)) and date.isoformat() not in tabs.values():
+                    tabs[handle] = date.isoformat()
+                    break
+    finally:
+        driver.switch_to.window(original)
+
+    missing = [d.isoformat() for d in dates if d.isoformat() not in tabs.values()]
+    if missing:
+        print(f"⚠️ 没有找到这些日期的预订标签页: {', '.join(missing)}（请为每个日期各开一个标签页）")
+    return tabs
+
+
+class CancellationWatcher:
+    """
+    监控一个或多个日期标签页，出现符合偏好的时间段时立即预订
+
+    Args:
+        driver: WebDriver
+        tabs: {窗口句柄: 标签名}
+        config: tennis_booking 的配置字典（courts、hour_range、num_slots、click_confirm）
+        interval: 两次检查之间的间隔（秒），实际间隔会加 ±10% 抖动
+        quiet_hours: 静默时段列表，如 ["23:00-06:30"]
+        settle: 调用 refreshDayView() 后等待时间表更新的秒数
+        max_bookings: 成功预订多少次后退出（0 表示不限）
+        diagnostics: DiagnosticsRecorder（可选）
+    """
+
+    def __init__(self, driver, tabs, config, interval=60, quiet_hours=None, settle=2,
+                 max_bookings=1, diagnostics=None):
+        self.driver = driver
+        self.tabs = tabs
+        self.config = config
+        self.interval = interval
+        self.quiet_periods = parse_quiet_hours(quiet_hours)
+        self.settle = settle
+        self.max_bookings = max_bookings
+        self.diagnostics = diagnostics
+        self.seen = {handle: set() for handle in tabs}
+        self.attempted = {handle: set() for handle in tabs}
+        self.bookings = []
+        self.polls = 0
+
+    def matching(self, values):
+        """筛选符合场地号和时间范围的 data-value"""
+        from tennis_booking import slot_matches
+
+        start, end = self.config["hour_range"]
+        return {v for v in values if slot_matches(v, self.config["courts"], start, end)}
+
+    def poll(self):
+        """
+        刷新所有标签页并做变化检测
+
+        Returns:
+            {窗口句柄: 新出现且符合偏好的 data-value 集合}
+        """
+        # 先在所有标签页发起刷新，只等待一次
+        for handle in self.tabs:
+            self.driver.switch_to.window(handle)
+            self.driver.execute_script(REFRESH_SCRIPT)
+        time.sleep(self.settle)
+
+        self.polls += 1
+        changed = {}
+        for handle, label in self.tabs.items():
+            self.driver.switch_to.window(handle)
+            values = set(self.driver.execute_script(AVAILABLE_VALUES_SCRIPT))
+            # 已经消失的时间段不再记为尝试过：之后有人再次退订时会重新预订
+            self.attempted[handle] &= values
+            if values != self.seen[handle]:
+                freed = values - self.seen[handle]
+                if freed and self.polls > 1:
+                    print(f"\n🔔 [{label}] 新出现 {len(freed)} 个时间段: {', '.join(sorted(freed))}")
+                self.seen[handle] = values
+            fresh = self.matching(values) - self.attempted[handle]
+            if fresh:
+                changed[handle] = fresh
+        return changed
+
+    def book(self, handle, fresh):
+        """
+        在指定标签页中立即预订：poll() 刚刷新并读取过时间表，这里不再刷新和等待，
+        直接扫描（settle=0）、规划、选择并点击 Book
+        """
+        import tennis_booking as tb
+
+        label = self.tabs[handle]
+        print(f"\n🚀 [{label}] 发现符合偏好的时间段，立即预订: {', '.join(sorted(fresh))}")
+        self.attempted[handle] |= fresh
+        self.driver.switch_to.window(handle)
+        if self.diagnostics:
+            self.diagnostics.next_attempt(1)
+
+        start, end = self.config["hour_range"]
+        try:
+            selected, count, details = tb.select_slots(self.driver, self.config["num_slots"],
+                                                       court_numbers=self.config["courts"],
+                                                       time_range_start=start, time_range_end=end, settle=0)
+            if not selected:
+                failure = ("select_failed", f"只选择了 {count}/{self.config['num_slots']} 个时间段")
+            elif not tb.click_book_button(self.driver):
+                failure = ("book_button_missing", "未找到Book按钮")
+            else:
+                failure = None
+                if not tb.handle_confirmation_dialog(self.driver, click_confirm=self.config["click_confirm"]):
+                    if self.diagnostics:
+                        self.diagnostics.capture(self.driver, "dialog_missing", "未找到确认框按钮")
+                print(f"\n✅ [{label}] 预订完成: {', '.join(t for t, _ in details)}")
+                self.bookings.append((label, details))
+
+            if failure:
+                print(f"\n⚠️ [{label}] 预订未完成: {failure[1]}")
+                if self.diagnostics:
+                    self.diagnostics.capture(self.driver, *failure)
+                tb.deselect_slots(self.driver)
+                details = []
+        finally:
+            if self.diagnostics:
+                self.diagnostics.flush()
+        return details
+
+    def run(self):
+        """持续监控，直到达到 max_bookings 或用户按 Ctrl+C"""
+        labels = ", ".join(self.tabs.values())
+        print(f"\n👀 退订监控：{labels}，每 {self.interval} 秒检查一次")
+        if self.quiet_periods:
+            print(f"   静默时段: {', '.join(self.config.get('quiet_hours') or [])}")
+
+        while True:
+            if in_quiet_hours(self.quiet_periods):
+                print(f"\r😴 静默时段 {datetime.now().strftime('%H:%M:%S')}", end="", flush=True)
+                time.sleep(60)
+                continue
+
+            try:
+                changed = self.poll()
+            except Exception as e:
+                print(f"\n⚠️ 检查失败: {e}")
+                changed = {}
+
+            for handle, fresh in changed.items():
+                try:
+                    self.book(handle, fresh)
+                except Exception as e:
+                    print(f"\n⚠️ [{self.tabs[handle]}] 预订出错: {e}")
+                if self.max_bookings and len(self.bookings) >= self.max_bookings:
+                    print(f"\n✅ 已完成 {len(self.bookings)} 次预订，退出监控")
+                    return self.bookings
+
+            print(f"\r⏳ {datetime.now().strftime('%H:%M:%S')} 已检查 {self.polls} 次，无新的符合偏好的时间段",
+                  end="", flush=True)
+            time.sleep(max(self.interval * random.uniform(0.9, 1.1) - self.settle, 0))